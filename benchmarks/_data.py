@@ -0,0 +1,107 @@
+"Shared fixtures for the benchmarks"
+import os
+import random
+import sys
+import tracemalloc
+
+os.environ.setdefault("DETA_ORM_DATABASE_MODE", "MEMORY")
+os.environ.setdefault("DETA_PROJECT_KEY", "")
+
+from src.models.extractor import DataExtractor
+from src.models.pokemon import Pokemon, SAVE_POKEMON_FORMAT, UPDATE_POKEMON_FORMATS
+
+
+def make_box(size: int, seed: int = 0) -> list[Pokemon]:
+    "A box of `size` random pokemons with save IDs 1..size"
+    rng = random.Random(seed)
+    return [
+        Pokemon(
+            poke_save_id=save_id,
+            pokedex_num=rng.randint(1, 649),
+            poke_exp=rng.randint(0, 10 ** 6),
+            poke_lvl=rng.randint(1, 100),
+            move_1_id=rng.randint(1, 500),
+            move_2_id=rng.randint(0, 500),
+            move_3_id=rng.randint(0, 500),
+            move_4_id=rng.randint(0, 500),
+            targetting_type=rng.randint(1, 3),
+            poke_gender=rng.randint(0, 2),
+            poke_party_pos=save_id - 1,
+            poke_extra=rng.choice((0, 0, 0, 1, 2)),
+            poke_held_item=rng.randint(0, 50),
+            poke_is_hacked_tag='n',
+            poke_selected_move=rng.randint(1, 4),
+            poke_selected_ability=0,
+            poke_nickname=f"Poke{save_id}",
+        )
+        for save_id in range(1, size + 1)
+    ]
+
+
+def make_save(box: list[Pokemon]) -> str:
+    "The `extra3` sent by `saveStory` when catching every pokemon of the box"
+    writer = DataExtractor('')
+    writer.write_number(len(box))
+    for poke in box:
+        writer.write_number(1)  # Number of fields
+        writer.write_double_number(0)  # New pokemon
+        writer.write_number(1)  # Full data
+        SAVE_POKEMON_FORMAT.write(writer, poke)
+    return writer.finalize()
+
+
+def make_update_save(box: list[Pokemon], field_ids: tuple[int, ...] = (2, 3, 4, 8)) -> str:
+    "The `extra3` sent by `saveStory` when every pokemon of the box changed these fields"
+    writer = DataExtractor('')
+    writer.write_number(len(box))
+    for poke in box:
+        writer.write_number(len(field_ids))
+        writer.write_double_number(poke.poke_save_id)
+        for field_id in field_ids:
+            writer.write_number(field_id)
+            UPDATE_POKEMON_FORMATS[field_id].write(writer, poke)
+    return writer.finalize()
+
+
+def report(title: str, timings: dict) -> None:
+    "Prints a table of `label -> seconds`"
+    print(title)
+    for label, seconds in timings.items():
+        print(f"  {label:<40} {seconds * 1000:10.3f} ms")
+
+
+def memory(function) -> tuple[int, int]:
+    "Bytes still allocated once `function` returned, and bytes temporarily allocated on top of those while running it"
+    tracemalloc.start()
+    result = function()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, peak - current
+
+
+def allocations(function) -> int:
+    """Number of memory blocks allocated while running `function`, including the ones freed right away
+
+    `sys.getallocatedblocks` only counts the blocks currently allocated, so it is read after every bytecode instruction
+    and the increases are added up. Blocks allocated and freed within a single instruction are missed.
+    """
+    total = 0
+    last = sys.getallocatedblocks()
+
+    def trace(frame, event, arg):
+        nonlocal total, last
+        frame.f_trace_opcodes = True
+        current = sys.getallocatedblocks()
+        increase = current - last - (event == "call")  # Tracing allocates a frame object for every call
+        if increase > 0:
+            total += increase
+        last = current
+        return trace
+
+    sys.settrace(trace)
+    try:
+        function()
+    finally:
+        sys.settrace(None)
+    return total
@@ -0,0 +1,46 @@
+"""Measures decoding and re-encoding many loadStoryProfile `extra3` strings, one by one and with `src.models.batch`
+
+Usage: python -m benchmarks.batch (requires numpy)
+"""
+import timeit
+
+from benchmarks._data import make_box, report
+
+from src.models import batch
+from src.models.extractor import DataExtractor
+from src.models.pokemon import Pokemon, PokeLoader, STORY_POKEMON_FORMAT
+
+
+def decode_one_by_one(strings: list[str]) -> list[list[Pokemon]]:
+    boxes = []
+    for string in strings:
+        extractor = DataExtractor(string)
+        extractor.read_number()  # Length
+        load = STORY_POKEMON_FORMAT.load
+        boxes.append([load(extractor, Pokemon, poke_nickname=None) for _ in range(extractor.read_number())])
+    return boxes
+
+
+def main() -> None:
+    for strings_count, box_size in ((1000, 30), (100, 300), (10, 1000)):
+        strings = [PokeLoader.encode_story_pokemons(make_box(box_size, seed), {}) for seed in range(strings_count)]
+        columns, counts = batch.decode_batch(strings, STORY_POKEMON_FORMAT)
+        assert batch.encode_batch(columns, counts, STORY_POKEMON_FORMAT) == strings
+        boxes = decode_one_by_one(strings)
+        number = 3
+        report(
+            f"{strings_count} strings of {box_size} pokemons",
+            {
+                label: timeit.timeit(function, number=number) / number
+                for label, function in {
+                    "decode, one by one": lambda: decode_one_by_one(strings),
+                    "decode_batch": lambda: batch.decode_batch(strings, STORY_POKEMON_FORMAT),
+                    "encode, one by one": lambda: [PokeLoader.encode_story_pokemons(box, {}) for box in boxes],
+                    "encode_batch": lambda: batch.encode_batch(columns, counts, STORY_POKEMON_FORMAT),
+                }.items()
+            },
+        )
+
+
+if __name__ == "__main__":
+    main()
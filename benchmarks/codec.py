@@ -0,0 +1,38 @@
+"""Compares the generic Record encoding/decoding with the codecs generated for each Record class
+
+Usage: python -m benchmarks.codec
+"""
+import timeit
+
+from benchmarks._data import make_box, report
+
+from src.database import Database
+from src.models.pokemon import Pokemon
+
+
+def main() -> None:
+    box = make_box(1000)
+    base = Database("bench_codec", record_type=Pokemon)
+    encoded = [base.encode_entry(poke) for poke in box]
+    number = 20
+
+    def generic_decode():
+        for record in encoded:
+            base.decode_entry(dict(record))
+
+    def compiled_decode():
+        for record in encoded:
+            base._decode_checked(dict(record))
+
+    timings = {
+        "encode (generic)": timeit.timeit(lambda: [base.encode_entry(poke) for poke in box], number=number),
+        "encode (compiled)": timeit.timeit(lambda: [base._encode_record(poke) for poke in box], number=number),
+        "decode (generic)": timeit.timeit(generic_decode, number=number),
+        "decode (compiled)": timeit.timeit(compiled_decode, number=number),
+    }
+    # With 1000 pokemons, milliseconds per box are also microseconds per pokemon
+    report(f"Encoding/decoding a {len(box)} pokemon box", {label: seconds / number for label, seconds in timings.items()})
+
+
+if __name__ == "__main__":
+    main()
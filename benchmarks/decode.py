@@ -0,0 +1,76 @@
+"""Measures decoding the `extra3` of a 500 pokemon box
+
+Usage: python -m benchmarks.decode
+
+Reads the same records through the Number/DoubleNumber wrappers (which allocate a wrapper and a (number, index) tuple
+for every value), the plain int readers of DataExtractor, and the reader generated from SAVE_POKEMON_FORMAT.
+Next to the time of each reader is the number of memory blocks it allocates, including short-lived ones
+such as the wrappers.
+"""
+import timeit
+
+from benchmarks._data import allocations, make_box, make_save
+
+from src.models.extractor import DataExtractor
+from src.models.pokemon import PokeLoader, SAVE_POKEMON_FORMAT
+
+
+def read_records(extractor: DataExtractor, count: int, wrapped: bool) -> list[tuple]:
+    "Reads the records field by field, with DataExtractor methods"
+    if wrapped:
+        number = lambda: extractor.get_number().value
+        double_number = lambda: extractor.get_double_number().value
+    else:
+        number, double_number = extractor.read_number, extractor.read_double_number
+    records = []
+    for _ in range(count):
+        number(), double_number(), number()
+        records.append((
+            number(), double_number(), number(), number(), number(), number(), number(), number(), number(),
+            number(), number(), number(), extractor.get_string(), number(), number(), number(), number(),
+        ))
+    return records
+
+
+def read_generated(extractor: DataExtractor, count: int) -> list[tuple]:
+    "Reads the records with the generated reader"
+    read_number, read_double_number, read = extractor.read_number, extractor.read_double_number, SAVE_POKEMON_FORMAT.read
+    records = []
+    for _ in range(count):
+        read_number(), read_double_number(), read_number()
+        records.append(read(extractor))
+    return records
+
+
+def main() -> None:
+    box = make_box(500)
+    data = make_save(box)
+
+    def run(function):
+        def read():
+            extractor = DataExtractor(data)
+            extractor.read_numbers(2)  # Length and number of pokemons
+            records = function(extractor)
+            assert extractor.current_index == len(extractor.data)
+            return records
+        return read
+
+    def load():
+        loader = PokeLoader(data=data, pokemons=[])
+        loader.load()
+        return loader.to_insert
+
+    number = 50
+    print(f"Decoding the extra3 of a {len(box)} pokemon box (time, allocated blocks)")
+    for label, function in {
+        "Number wrappers": run(lambda extractor: read_records(extractor, len(box), True)),
+        "read_number": run(lambda extractor: read_records(extractor, len(box), False)),
+        "SAVE_POKEMON_FORMAT.read": run(lambda extractor: read_generated(extractor, len(box))),
+        "PokeLoader.load": load,
+    }.items():
+        seconds = timeit.timeit(function, number=number) / number
+        print(f"  {label:<40} {seconds * 1000:10.3f} ms {allocations(function):10} blocks")
+
+
+if __name__ == "__main__":
+    main()
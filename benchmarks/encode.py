@@ -0,0 +1,77 @@
+"""Measures PokeLoader.encode_story_pokemons on boxes of 10 to 1000 pokemons
+
+Usage: python -m benchmarks.encode
+
+The time per pokemon should stay flat as the box grows. The previous writer, concatenating to `data`
+on every write, is measured alongside for comparison.
+"""
+import timeit
+
+from benchmarks._data import make_box
+
+from src.models.extractor import DataExtractor, encode
+from src.models.pokemon import Pokemon, PokeLoader
+
+
+class ConcatWriter(DataExtractor):
+    "DataExtractor with the previous writer, appending to `data` on every write"
+
+    def write_number(self, number: int, prepend: bool = False) -> None:
+        string = str(number)
+        self.data += str(len(string)) + string
+
+    def write_double_number(self, number: int, prepend: bool = False) -> None:
+        string = str(number)
+        size = str(len(string))
+        self.data += str(len(size)) + size + string
+
+    def write_string(self, string: str) -> None:
+        self.data += str(len(string)) + string
+
+
+def encode_concatenated(pokemons: list[Pokemon], url_parameters: dict) -> str:
+    "The previous `PokeLoader.encode_story_pokemons`, writing field by field with `ConcatWriter`"
+    pokemons.sort(key=lambda poke: poke.poke_party_pos)
+    self = ConcatWriter('')
+    self.write_number(len(pokemons))
+    for i, pokemon in enumerate(pokemons, 1):
+        url_parameters[f"PN{i}"] = pokemon.poke_nickname
+        self.write_number(pokemon.pokedex_num)
+        self.write_double_number(pokemon.poke_exp)
+        self.write_number(pokemon.poke_lvl)
+        self.write_number(pokemon.move_1_id)
+        self.write_number(pokemon.move_2_id)
+        self.write_number(pokemon.move_3_id)
+        self.write_number(pokemon.move_4_id)
+        self.write_number(pokemon.targetting_type)
+        self.write_number(pokemon.poke_gender)
+        self.write_double_number(pokemon.poke_save_id)
+        self.write_number(pokemon.poke_party_pos)
+        self.write_number(pokemon.poke_extra)
+        self.write_number(pokemon.poke_held_item)
+        self.write_string(pokemon.poke_is_hacked_tag)
+        self.write_number(0)  # unused 1
+        self.write_number(pokemon.poke_selected_move)
+        self.write_number(pokemon.poke_selected_ability)
+        self.write_number(0)  # unused 2
+        self.write_number(0)  # unused 3
+    return encode(self.get_length() + self.data)
+
+
+def main() -> None:
+    print("Encoding a box for loadStoryProfile")
+    print(f"  {'pokemons':>8} {'buffered':>12} {'per pokemon':>12} {'concatenated':>14} {'per pokemon':>12}")
+    for size in (10, 30, 100, 300, 1000):
+        box = make_box(size)
+        assert PokeLoader.encode_story_pokemons(box, {}) == encode_concatenated(box, {})
+        number = max(1, 2000 // size)
+        buffered = timeit.timeit(lambda: PokeLoader.encode_story_pokemons(box, {}), number=number) / number
+        concatenated = timeit.timeit(lambda: encode_concatenated(box, {}), number=number) / number
+        print(
+            f"  {size:>8} {buffered * 1000:9.3f} ms {buffered / size * 1e6:9.2f} us"
+            f" {concatenated * 1000:11.3f} ms {concatenated / size * 1e6:9.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compares the local base storage formats on `saveStory` / `loadStoryProfile` style round trips,
+and the size and loading time of DISK bases written with each of them
+
+Usage: python -m benchmarks.local_storage
+"""
+import os
+import tempfile
+import timeit
+
+from benchmarks._data import make_box, report
+
+from src.database import Database, Query, Field
+from src.database._local_base import Base as LocalBase, _disk_inventory
+from src.models.pokemon import Pokemon
+
+
+def round_trip(base: Database, box: list[Pokemon]) -> None:
+    "Save the whole box then load it back, like `set_save_data` followed by `get_story_profile`"
+    base.put_many(box, key_source=lambda record: f"bench$1${record.poke_save_id}", iter=True)
+    base.fetch(Query(Field("key").startswith("bench$1")), follow_last=True)
+
+
+def raw_round_trip(base: LocalBase, records: list[dict]) -> None:
+    "Same as `round_trip`, without the Record encoding/decoding done by the Database"
+    base.put_many(records)
+    base.fetch([{"key?pfx": "bench$1"}], limit=None, last=None)
+
+
+def disk_main(box_size: int = 5000) -> None:
+    "Size on disk, time to load at startup and time to decode every record of a DISK base"
+    box = make_box(box_size)
+    with tempfile.TemporaryDirectory() as folder:
+        os.environ["DETA_ORM_FOLDER"] = folder
+        print(f"DISK base of {box_size} pokemons")
+        for storage_format in ("JSON", "NATIVE", "ROWS"):
+            name = f"bench_disk_{storage_format}"
+            base = LocalBase(name, sync_disk=True, storage_format=storage_format)
+            encoder = Database(name, record_type=Pokemon)
+            base.put_many([dict(encoder.encode_entry(poke), key=str(poke.poke_save_id)) for poke in box])
+            base.inventory.compact()
+            size = os.path.getsize(os.path.join(folder, f"{name}.json"))
+
+            def load_base():
+                _disk_inventory.clear()  # Otherwise the backend already loaded by `base` is reused
+                LocalBase(name, sync_disk=True, storage_format=storage_format)
+            load = timeit.timeit(load_base, number=3) / 3
+            decode = timeit.timeit(lambda: [base.get(key) for key in base.inventory], number=3) / 3
+            print(
+                f"  {storage_format:<8} {size / 1024:10.1f} KB  load {load * 1000:8.2f} ms"
+                f"  get {decode / box_size * 10 ** 6:6.2f} us per record"
+            )
+
+
+def main() -> None:
+    for box_size in (30, 200, 1000):
+        box = make_box(box_size)
+        raw_records = [dict(poke.to_dict(), key=f"bench$1${poke.poke_save_id}") for poke in box]
+        number = max(1, 2000 // box_size)
+        timings = {}
+        for storage_format in ("JSON", "NATIVE", "ROWS"):
+            os.environ["DETA_ORM_STORAGE_FORMAT"] = storage_format
+            base = Database(f"bench_{storage_format}_{box_size}", record_type=Pokemon)
+            # Other players' data, which should not matter for the prefix fetches
+            base.put_many(make_box(5000, seed=1), key_source=lambda record: f"other${record.poke_save_id}", iter=True)
+            timings[f"{storage_format} (Database)"] = timeit.timeit(lambda: round_trip(base, box), number=number) / number
+
+            local_base = LocalBase(f"bench_raw_{storage_format}_{box_size}")
+            timings[f"{storage_format} (local base only)"] = timeit.timeit(lambda: raw_round_trip(local_base, raw_records), number=number) / number
+        report(f"Round trip of a {box_size} pokemon box", timings)
+    disk_main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Memory used by a box of slotted pokemons, compared to the same dataclass without `__slots__`
+
+Usage: python -m benchmarks.memory
+"""
+import dataclasses
+import tracemalloc
+
+from benchmarks._data import make_box
+
+from src.database import Record
+from src.models.pokemon import Pokemon
+
+UnslottedPokemon = dataclasses.make_dataclass(
+    "UnslottedPokemon",
+    [(field.name, field.type) for field in dataclasses.fields(Pokemon)],
+    bases=(Record,),
+)
+
+
+def measure(cls: type, dicts: list[dict]) -> int:
+    "Bytes used by the Records loaded from `dicts`, like after decoding a fetch"
+    tracemalloc.start()
+    records = [cls.from_dict(data) for data in dicts]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current
+
+
+def main() -> None:
+    box_size = 500
+    dicts = [poke.to_dict() for poke in make_box(box_size)]
+    print(f"Memory used by a {box_size} pokemon box")
+    for cls in (UnslottedPokemon, Pokemon):
+        used = measure(cls, dicts)
+        print(f"  {cls.__name__:<40} {used / 1024:10.1f} KB  ({used / box_size:6.0f} bytes per pokemon)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Measures Record.to_dict / from_dict on a large box, against the generic versions
+
+Usage: python -m benchmarks.records
+"""
+import timeit
+
+from benchmarks._data import make_box, memory, report
+
+from src.models.pokemon import Pokemon
+
+
+def main() -> None:
+    box = make_box(1000)
+    dicts = [poke.to_dict() for poke in box]
+    number = 20
+    functions = {
+        "to_dict (generic)": lambda: [poke._to_dict() for poke in box],
+        "to_dict": lambda: [poke.to_dict() for poke in box],
+        "from_dict (generic)": lambda: [Pokemon._from_dict(data) for data in dicts],
+        "from_dict": lambda: [Pokemon.from_dict(data) for data in dicts],
+    }
+    report(
+        f"Converting a {len(box)} pokemon box",
+        {label: timeit.timeit(function, number=number) / number for label, function in functions.items()},
+    )
+    print(f"Memory used while converting a {len(box)} pokemon box (result + temporary)")
+    for label, function in functions.items():
+        result, temporary = memory(function)
+        print(f"  {label:<40} {result / 1024:10.1f} KB + {temporary / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Measures PokeLoader.load on saves updating every pokemon of boxes of 100 to 1000 pokemons
+
+Usage: python -m benchmarks.save
+
+The time per pokemon should stay flat as the box grows.
+"""
+import dataclasses
+import timeit
+
+from benchmarks._data import make_box, make_update_save
+
+from src.models.pokemon import PokeLoader
+
+
+def main() -> None:
+    print("Loading a save updating the level, experience, moves and position of every pokemon")
+    print(f"  {'pokemons':>8} {'load':>12} {'per pokemon':>12}")
+    for size in (100, 300, 1000, 3000):
+        box = make_box(size)
+        changed = [
+            dataclasses.replace(poke, poke_lvl=poke.poke_lvl + 1, poke_exp=poke.poke_exp + 100, poke_party_pos=size - index)
+            for index, poke in enumerate(box)
+        ]
+        data = make_update_save(changed)
+
+        def load() -> PokeLoader:
+            loader = PokeLoader(data=data, pokemons=[dataclasses.replace(poke) for poke in box])
+            loader.load()
+            return loader
+
+        loader = load()
+        assert loader.to_update == changed
+        number = max(1, 3000 // size)
+        seconds = timeit.timeit(load, number=number) / number
+        print(f"  {size:>8} {seconds * 1000:9.3f} ms {seconds / size * 1e6:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
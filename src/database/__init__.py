@@ -1,10 +1,16 @@
-from src.database.database import Database
-from src.database.record import Record
+from src.database.database import Database, get_executor
+from src.database.async_database import AsyncDatabase
+from src.database.cache import RecordCache
+from src.database.record import Record, slotted_dataclass
 from src.database.query import Query, Field
 
 __all__ = [
     "Database",
+    "AsyncDatabase",
+    "RecordCache",
     "Record",
+    "slotted_dataclass",
     "Query",
     "Field",
+    "get_executor",
 ]
@@ -1,97 +1,508 @@
+import bisect
 import functools
+import heapq
+import itertools
 import json
+import os
 import pathlib
-from typing import Callable, Optional
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Union
 
 from deta.base import Util
 
 from src.database.bound_meta import BoundMeta
+from src.database._local_query import compile_query
+
 
-operations = {
-    # no prefix = eq
-    "ne": lambda key, value, record: record.get(key) != value,
+class FetchResponse:
+    def __init__(self, count=0, last=None, items=[]):
+        self.count = count
+        self.last = last
+        self.items = items
 
-    "lt": lambda key, value, record: record.get(key) < value,
-    "lte": lambda key, value, record: record.get(key) <= value,
-    "gt": lambda key, value, record: record.get(key) > value,
-    "gte": lambda key, value, record: record.get(key) >= value,
 
-    "pfx": lambda key, value, record: record.get(key).startswith(value),
-    "r": lambda key, value, record: record.get(key) in range(*value),
-    "contains": lambda key, value, record: value in record.get(key),
-    "not_contains": lambda key, value, record: value not in record.get(key),
-}
+class KeyIndex:
+    "Sorted list of keys, so that prefix lookups only touch the matching range"
+
+    def __init__(self, keys=()):
+        self._keys = sorted(keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str) -> None:
+        index = bisect.bisect_left(self._keys, key)
+        if index == len(self._keys) or self._keys[index] != key:
+            self._keys.insert(index, key)
+
+    def discard(self, key: str) -> None:
+        index = bisect.bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+
+    def clear(self) -> None:
+        self._keys.clear()
+
+    def iter_from(self, after: Optional[str] = None) -> Iterator[str]:
+        "Iterates over all keys in order, starting after the key `after` if it is given"
+        keys = self._keys
+        index = 0 if after is None else bisect.bisect_right(keys, after)
+        while index < len(keys):  # By index rather than with `islice`, which would walk through the first keys
+            yield keys[index]
+            index += 1
+
+    def pop_prefix(self, prefix: str) -> list[str]:
+        "Removes and returns all keys starting with `prefix`"
+        start = stop = bisect.bisect_left(self._keys, prefix)
+        while stop < len(self._keys) and self._keys[stop].startswith(prefix):
+            stop += 1
+        keys = self._keys[start:stop]
+        del self._keys[start:stop]
+        return keys
+
+    def discard_many(self, keys: Iterable[str]) -> None:
+        keys = set(keys)
+        if len(keys) < 32:
+            for key in keys:
+                self.discard(key)
+        else:  # Rebuilding the list once is cheaper than shifting it once for each key
+            self._keys = [key for key in self._keys if key not in keys]
+
+    def prefix(self, prefix: str, after: Optional[str] = None) -> list[str]:
+        "Returns all keys starting with `prefix` in order, starting after the key `after` if it is given"
+        start = stop = bisect.bisect_left(self._keys, prefix)
+        if after is not None:
+            start = stop = max(start, bisect.bisect_right(self._keys, after))
+        while stop < len(self._keys) and self._keys[stop].startswith(prefix):
+            stop += 1
+        return self._keys[start:stop]
+
+
+class FieldIndex:
+    """Maps the values of one field to the keys of the records holding them, for equality and range lookups.
+
+    Numbers and strings are also kept in sorted lists of distinct values for range lookups.
+    Unhashable values (lists, dicts) are not indexed, as they can never match an equality or range condition.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._keys_by_value: dict = {}
+        self._value_of: dict = {}
+        self._numbers: list = []
+        self._strings: list = []
+
+    def _sorted_values(self, value) -> Optional[list]:
+        "Returns which sorted list of distinct values `value` belongs to, if any"
+        if isinstance(value, (int, float)):
+            return self._numbers
+        elif isinstance(value, str):
+            return self._strings
+        return None
+
+    def add(self, key: str, record: dict) -> None:
+        value = record.get(self.field)
+        try:
+            keys = self._keys_by_value.get(value)
+        except TypeError:  # Unhashable
+            return
+        if keys is None:
+            keys = self._keys_by_value[value] = set()
+            if (values := self._sorted_values(value)) is not None:
+                bisect.insort(values, value)
+        keys.add(key)
+        self._value_of[key] = value
+
+    def discard(self, key: str) -> None:
+        if key not in self._value_of:
+            return
+        value = self._value_of.pop(key)
+        keys = self._keys_by_value[value]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_value[value]
+            if (values := self._sorted_values(value)) is not None:
+                del values[bisect.bisect_left(values, value)]
+
+    def clear(self) -> None:
+        self.__init__(self.field)
+
+    def equal(self, value) -> set:
+        "Keys of the records whose field is equal to `value`"
+        try:
+            return set(self._keys_by_value.get(value, ()))
+        except TypeError:
+            return set()
+
+    def between(self, low=None, high=None, *, include_low: bool = True, include_high: bool = True) -> set:
+        "Keys of the records whose field is within the bounds. Pass `None` to leave a side unbounded."
+        values = self._sorted_values(low if low is not None else high)
+        if values is None:
+            return set()
+        if low is None:
+            start = 0
+        elif include_low:
+            start = bisect.bisect_left(values, low)
+        else:
+            start = bisect.bisect_right(values, low)
+        if high is None:
+            stop = len(values)
+        elif include_high:
+            stop = bisect.bisect_right(values, high)
+        else:
+            stop = bisect.bisect_left(values, high)
+        return set().union(*(self._keys_by_value[value] for value in values[start:stop]))
+
+    def lookup(self, operation: Optional[str], value) -> Optional[set]:
+        "Keys which may match the condition, or None if this index cannot answer it"
+        if operation is None:
+            return self.equal(value)
+        elif operation == "lt":
+            return self.between(high=value, include_high=False)
+        elif operation == "lte":
+            return self.between(high=value)
+        elif operation == "gt":
+            return self.between(low=value, include_low=False)
+        elif operation == "gte":
+            return self.between(low=value)
+        elif operation == "r":
+            return self.between(*value)
+        return None
+
+
+class ExpiryIndex:
+    "Expiration timestamps of the records, with a heap to quickly find the ones that expired"
+
+    def __init__(self):
+        self._expires: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+
+    def set(self, key: str, timestamp: Optional[float]) -> None:
+        "Sets (or removes, if `timestamp` is None) the expiration time of a key"
+        if timestamp is None:
+            self._expires.pop(key, None)
+            return
+        self._expires[key] = timestamp
+        heapq.heappush(self._heap, (timestamp, key))
+        if len(self._heap) > 2 * len(self._expires) + 64:  # Too many outdated entries
+            self._heap = [(timestamp, key) for key, timestamp in self._expires.items()]
+            heapq.heapify(self._heap)
+
+    def is_expired(self, key: str, now: float) -> bool:
+        timestamp = self._expires.get(key)
+        return timestamp is not None and timestamp <= now
+
+    def pop_expired(self, now: float) -> list[str]:
+        "Removes and returns all keys which expired by `now`"
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            timestamp, key = heapq.heappop(self._heap)
+            if self._expires.get(key) == timestamp:  # Not an outdated entry
+                del self._expires[key]
+                expired.append(key)
+        return expired
+
+
+class MemoryBaseBackend(dict):
+    """Database backend that only lives in memory.
+
+    Keeps a sorted `key_index` of its keys up to date with all modifications.
+    `field_indexes` and `expirations` are maintained by the `Base` using it, as they need the decoded records.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.key_index = KeyIndex(self)
+        self.field_indexes: dict[str, FieldIndex] = {}
+        self.expirations = ExpiryIndex()
+        self.lock = threading.RLock()  # Held by the `Base` while using the backend and its indexes
+        # Field names of the records stored by `RowStorage`, rows refer to them by index
+        self.schemas: list[tuple[str, ...]] = []
+        self.schema_ids: dict[tuple[str, ...], int] = {}
+        self.storage: Optional["Storage"] = None  # Format of the stored values, shared by every `Base` using the backend
+
+    def add_schema(self, fields: Iterable[str]) -> int:
+        "Registers the field names of a row format, returning its index"
+        fields = tuple(fields)
+        self.schema_ids[fields] = len(self.schemas)
+        self.schemas.append(fields)
+        return self.schema_ids[fields]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.key_index.add(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.key_index.discard(key)
+
+    def pop(self, key, *default):
+        value = super().pop(key, *default)
+        self.key_index.discard(key)
+        return value
 
+    def popitem(self):
+        key, value = super().popitem()
+        self.key_index.discard(key)
+        return key, value
 
-def parse_filter(filter_: dict) -> Callable[[dict], bool]:
-    result = []
-    for condition, value in filter_.items():
-        if isinstance(value, list):
-            raise Exception("Nested queries are not supported for local base yet")
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self.key_index.add(key)
+        return value
 
-        if "?" in condition:
-            key, operation = condition.rsplit("?", 1)
-            result.append(functools.partial(operations[operation], key, value))
+    def update(self, *args, **kwargs):
+        items = dict(*args, **kwargs)
+        super().update(items)
+        for key in items:
+            self.key_index.add(key)
+
+    def clear(self):
+        super().clear()
+        self.key_index.clear()
+
+    def delete_keys(self, keys: Iterable[str]) -> list[str]:
+        "Deletes multiple keys at once, ignoring missing ones. Returns the deleted keys."
+        deleted = []
+        for key in keys:
+            if key in self:
+                super().pop(key)
+                deleted.append(key)
+        self.key_index.discard_many(deleted)
+        return deleted
+
+    def delete_prefix(self, prefix: str) -> list[str]:
+        "Deletes all keys starting with `prefix` at once. Returns the deleted keys."
+        deleted = self.key_index.pop_prefix(prefix)
+        for key in deleted:
+            super().pop(key)
+        return deleted
+
+
+def _copy(value):
+    "Deep copies JSON-like data (dicts, lists and immutable values)"
+    if type(value) is dict:
+        return {k: _copy(v) if type(v) in (dict, list) else v for k, v in value.items()}
+    elif type(value) is list:
+        return [_copy(v) if type(v) in (dict, list) else v for v in value]
+    return value
+
+
+class Storage:
+    """How a `Base` stores its records in the backend
+
+    `dump` converts a record before storing it, `view` decodes a stored record (including its key),
+    `detach` copies a viewed record so that the caller may modify it freely,
+    and `adopt` converts values loaded from disk that may have been stored with another format.
+    """
+
+    def __init__(self, inventory: MemoryBaseBackend):
+        self.inventory = inventory
+
+    def _as_record(self, key: str, stored) -> dict:
+        "Decodes a value stored with any of the formats"
+        if isinstance(stored, str):
+            record = json.loads(stored)
+        elif isinstance(stored, list):
+            record = dict(zip(self.inventory.schemas[stored[0]], itertools.islice(stored, 1, None)))
         else:
-            key = condition
-            result.append(lambda record, _key=key, _value=value: record.get(_key) == _value)
+            record = _copy(stored)
+        record["key"] = key
+        return record
 
-    def match_record(record: dict) -> bool:
-        return all(function(record) for function in result)
 
-    return match_record
+class JSONStorage(Storage):
+    "Stores records as JSON strings"
 
+    def dump(self, key: str, record: dict) -> str:
+        return json.dumps(record)
 
-def parse_filters(filters: Optional[list[dict]]) -> Callable[[dict], bool]:
-    if filters is None:
-        return lambda _: True
-    parsed_filters = [parse_filter(filter_) for filter_ in filters]
+    def view(self, key: str, stored: str) -> dict:
+        "Decoded record including its key. May be the stored object itself, so it must not be modified."
+        record = json.loads(stored)
+        record["key"] = key
+        return record
 
-    def match_record(record: dict) -> bool:
-        return any(filter_(record) for filter_ in parsed_filters)
+    def detach(self, record: dict) -> dict:
+        "Returns a copy of a viewed record that the caller may modify freely"
+        return record  # Already a new object
 
-    return match_record
+    def adopt(self, key: str, stored):
+        "Converts a value loaded from disk that may have been stored in another format"
+        return stored if isinstance(stored, str) else json.dumps(self._as_record(key, stored))
 
 
-class FetchResponse:
-    def __init__(self, count=0, last=None, items=[]):
-        self.count = count
-        self.last = last
-        self.items = items
+class NativeStorage(Storage):
+    "Stores copies of the records themselves, without serializing them"
+
+    def dump(self, key: str, record: dict) -> dict:
+        record = _copy(record)
+        record["key"] = key
+        return record
+
+    def view(self, key: str, stored: dict) -> dict:
+        return stored
+
+    def detach(self, record: dict) -> dict:
+        return _copy(record)
+
+    def adopt(self, key: str, stored):
+        return stored if isinstance(stored, dict) else self._as_record(key, stored)
+
 
+class RowStorage(Storage):
+    """Stores records as lists of values, `[schema index, *values]`
 
-_memory_inventory = {}
+    The field names are kept once per base in the backend's `schemas` instead of once per record,
+    which makes DISK bases a lot smaller and faster to load, and rows cheaper to decode than JSON strings.
+    """
+
+    def dump(self, key: str, record: dict) -> list:
+        fields = tuple(field for field in record if field != "key")
+        schema_id = self.inventory.schema_ids.get(fields)
+        if schema_id is None:
+            schema_id = self.inventory.add_schema(fields)
+        return [schema_id, *(_copy(record[field]) for field in fields)]
+
+    def view(self, key: str, stored: list) -> dict:
+        record = dict(zip(self.inventory.schemas[stored[0]], stored[1:]))
+        record["key"] = key
+        return record
+
+    def detach(self, record: dict) -> dict:
+        # Viewed records are new dictionaries, only the nested values are shared with the stored row
+        for field, value in record.items():
+            if type(value) in (dict, list):
+                record[field] = _copy(value)
+        return record
+
+    def adopt(self, key: str, stored):
+        return stored if isinstance(stored, list) else self.dump(key, self._as_record(key, stored))
+
+
+storage_formats = {
+    "NATIVE": NativeStorage,
+    "JSON": JSONStorage,
+    "ROWS": RowStorage,
+}
+
+_memory_inventory: dict[str, MemoryBaseBackend] = {}
+# One backend per file, so that every `Base` of a name writes to the same journal and compactions keep all their writes
+_disk_inventory: dict[pathlib.Path, "DiskBaseBackend"] = {}
+_inventory_lock = threading.Lock()
+
+
+def _locked(method):
+    "Hold the inventory's lock while running the method, so that bases may be used from multiple threads"
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        with self.inventory.lock:
+            return method(self, *args, **kwargs)
+    return wrapped
 
 
 class Base:
-    def __init__(self, name: str, sync_disk: bool = False):
+    def __init__(self, name: str, sync_disk: bool = False, indexes: Iterable[str] = (), storage_format: Optional[str] = None):
         self.name = name
-        if sync_disk:
-            self.inventory = DiskBaseBackend(name + '.json')
-        else:
-            self.inventory = _memory_inventory.setdefault(name, {})
-
+        if storage_format is None:
+            storage_format = os.getenv("DETA_ORM_STORAGE_FORMAT", "NATIVE")
+        if storage_format not in storage_formats:
+            raise Exception("Invalid value for DETA_ORM_STORAGE_FORMAT environment variable")
+        with _inventory_lock:
+            if sync_disk:
+                path = (pathlib.Path(os.getenv("DETA_ORM_FOLDER")) / (name + '.json')).resolve()
+                if path not in _disk_inventory:
+                    _disk_inventory[path] = DiskBaseBackend(name + '.json')
+                self.inventory = _disk_inventory[path]
+            else:
+                self.inventory = _memory_inventory.setdefault(name, MemoryBaseBackend())
+        with self.inventory.lock:
+            if type(self.inventory.storage) is not storage_formats[storage_format]:
+                self._adopt(storage_formats[storage_format](self.inventory))
+        self.field_indexes = self.inventory.field_indexes
+        self.expirations = self.inventory.expirations
+        self._sweep()
+        for field in indexes:
+            if field not in self.field_indexes:
+                index = FieldIndex(field)
+                for key, value in self.inventory.items():
+                    index.add(key, self.storage.view(key, value))
+                self.field_indexes[field] = index
+
+    @property
+    def storage(self) -> Storage:
+        "Format of the stored values, shared with the other bases of the same backend"
+        return self.inventory.storage
+
+    def _adopt(self, storage: Storage) -> None:
+        "Converts the stored values to another format, for every base using the backend"
+        for key, value in list(self.inventory.items()):
+            # Files written by older versions or with another format, no need to write them back until the next compaction
+            if (adopted := storage.adopt(key, value)) is not value:
+                dict.__setitem__(self.inventory, key, adopted)
+            self.inventory.expirations.set(key, storage.view(key, adopted).get("__expires"))
+        self.inventory.storage = storage
+
+    def _index_record(self, key: str, record: Optional[dict]) -> None:
+        "Update the field indexes for a record that was replaced (or deleted, if `record` is None)"
+        for index in self.field_indexes.values():
+            index.discard(key)
+            if record is not None:
+                index.add(key, record)
+
+    def _sweep(self) -> None:
+        "Deletes all records which expired"
+        for key in self.expirations.pop_expired(time.time()):
+            self.inventory.pop(key, None)
+            self._index_record(key, None)
+
+    @staticmethod
+    def _expiration(expire_in: Optional[int], expire_at: Union[datetime, int, float, None]) -> Optional[int]:
+        "Converts the `expire_in` and `expire_at` parameters into an unix timestamp, like Deta Base does"
+        if expire_in is not None:
+            return int(time.time()) + expire_in
+        if isinstance(expire_at, datetime):
+            return int(expire_at.replace(microsecond=0).timestamp())
+        if expire_at is not None:
+            return int(expire_at)
+        return None
+
+    def _store(self, key: str, record: dict, expires: Optional[int]) -> None:
+        "Writes a record that passed all checks, keeping the indexes up to date"
+        if expires is not None:
+            record = dict(record, __expires=expires)
+        self.inventory[key] = self.storage.dump(key, record)
+        self._index_record(key, record)
+        self.expirations.set(key, expires)
+
+    @_locked
     def get(self, key):
+        self._sweep()
         obj = self.inventory.get(key)
         if obj:
-            obj = json.loads(obj)
+            obj = self.storage.detach(self.storage.view(key, obj))
         return obj
 
-    def insert(self, data, key, *, expire_in: None = None, expire_at: None = None):
-        if expire_in:
-            print(f"Ignoring parameter (not supported by local base): {expire_in=}")
-        if expire_at:
-            print(f"Ignoring parameter (not supported by local base): {expire_at=}")
-
+    @_locked
+    def insert(self, data, key, *, expire_in: Optional[int] = None, expire_at: Union[datetime, int, None] = None):
+        self._sweep()
         if key in self.inventory:
             raise Exception(f"Item with key '{key}' already exists")
-        self.inventory[key] = json.dumps(data)
+        self._store(key, data, self._expiration(expire_in, expire_at))
 
+    @_locked
     def update(self, updates, key):
+        self._sweep()
         if key not in self.inventory:
             raise Exception(f"Key '{key}' not found")
 
-        obj = json.loads(self.inventory[key])
+        obj = self.storage.detach(self.storage.view(key, self.inventory[key]))
+        del obj["key"]
 
         for attribute, value in updates.items():
             if isinstance(value, Util.Trim):
@@ -107,48 +518,152 @@ class Base:
             else:
                 obj[attribute] = value
 
-        self.inventory[key] = json.dumps(obj)
+        self.inventory[key] = self.storage.dump(key, obj)
+        self._index_record(key, obj)
 
+    @_locked
     def delete(self, key):
-        del self.inventory[key]
-
-    def put_many(self, items):
-        items = {record.pop('key'): json.dumps(record) for record in (item.copy() for item in items)}
-        self.inventory.update(items)
-
-    def put(self, item, key, *, expire_in: None = None, expire_at: None = None):
-        if expire_in:
-            print(f"Ignoring parameter (not supported by local base): {expire_in=}")
-        if expire_at:
-            print(f"Ignoring parameter (not supported by local base): {expire_at=}")
-        self.inventory[key] = json.dumps(item)
-
+        self._sweep()
+        if self.inventory.pop(key, None) is not None:
+            self._index_record(key, None)
+            self.expirations.set(key, None)
+
+    @_locked
+    def delete_many(self, keys: Iterable[str]) -> None:
+        self._sweep()
+        for key in self.inventory.delete_keys(keys):
+            self._index_record(key, None)
+            self.expirations.set(key, None)
+
+    @_locked
+    def delete_prefix(self, prefix: str) -> None:
+        self._sweep()
+        for key in self.inventory.delete_prefix(prefix):
+            self._index_record(key, None)
+            self.expirations.set(key, None)
+
+    @_locked
+    def put_many(self, items, *, expire_in: Optional[int] = None, expire_at: Union[datetime, int, None] = None):
+        self._sweep()
+        expires = self._expiration(expire_in, expire_at)
+        records = {record.pop('key'): record for record in (item.copy() for item in items)}
+        if expires is not None:
+            for record in records.values():
+                record["__expires"] = expires
+        self.inventory.update({key: self.storage.dump(key, record) for key, record in records.items()})
+        for key, record in records.items():
+            self._index_record(key, record)
+            self.expirations.set(key, expires)
+
+    @_locked
+    def put(self, item, key, *, expire_in: Optional[int] = None, expire_at: Union[datetime, int, None] = None):
+        self._sweep()
+        self._store(key, item, self._expiration(expire_in, expire_at))
+
+    def _filter_candidates(self, filter_: dict, last: Optional[str]) -> Optional[Iterable[str]]:
+        """Returns the keys that may match one (AND'ed) filter, or None if it would require a full scan.
+
+        Uses the key index for conditions on the `key`, and the field indexes for conditions on indexed fields.
+        If there are multiple usable conditions, intersects their results, starting from the smallest.
+        """
+        key_index = self.inventory.key_index
+        candidates = []
+        for condition, value in filter_.items():
+            field, _, operation = condition.partition("?")
+            operation = operation or None
+            if field == "key":
+                if operation == "pfx":
+                    candidates.append(key_index.prefix(value, after=last))
+                elif operation is None:
+                    candidates.append([value] if value in self.inventory and (last is None or value > last) else [])
+            elif (index := self.field_indexes.get(field)) is not None:
+                if (keys := index.lookup(operation, value)) is not None:
+                    candidates.append(keys)
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        if len(candidates) == 1:
+            return candidates[0]
+        smallest, *others = candidates
+        return set(smallest).intersection(*others)
+
+    def _candidate_keys(self, query: Optional[list[dict]], last: Optional[str]) -> Iterable[str]:
+        """Returns the keys that may match the query in order, starting after the key `last`.
+
+        If every filter has a condition that can be answered by the key index or a field index,
+        only looks at the keys they return instead of scanning the whole base.
+        """
+        key_index = self.inventory.key_index
+        if not query:
+            return key_index.iter_from(last)
+        ranges = []
+        for filter_ in query:
+            candidates = self._filter_candidates(filter_, last)
+            if candidates is None:  # Could be anywhere, must scan everything
+                return key_index.iter_from(last)
+            ranges.append(candidates)
+        if len(ranges) == 1 and isinstance(ranges[0], list):
+            return ranges[0]
+        keys = sorted(set().union(*ranges))
+        if last is not None:
+            del keys[:bisect.bisect_right(keys, last)]
+        return keys
+
+    @_locked
     def fetch(self, query, limit, last):
+        """Returns up to `limit` matching records in key order, starting after the key `last`.
+
+        Stops as soon as the page is full, and sets the response's `last` to resume from there if any record is left.
+        """
+        if isinstance(query, dict):
+            query = [query]
+        if not isinstance(last, str):
+            last = None
+        if not limit or limit < 0:
+            limit = None
+        self._sweep()
         results = []
-        match_condition = parse_filters(query)
-        for key, value in self.inventory.items():
-            obj = json.loads(value)
-            obj["key"] = key
+        match_condition = compile_query(query)
+        candidates = iter(self._candidate_keys(query, last))
+        for key in candidates:
+            if (value := self.inventory.get(key)) is None:  # Deleted while iterating
+                continue
+            obj = self.storage.view(key, value)
             if match_condition(obj):
-                results.append(obj)
-        if isinstance(last, str):
-            index = next((i for i, record in enumerate(results) if record['key'] == last), None)
-            results = results[index:]
-        if limit and limit > 0:
-            results = results[:limit]
-        return FetchResponse(items=results)
+                results.append(self.storage.detach(obj))
+                if len(results) == limit:
+                    if self._any_match(candidates, match_condition):  # Otherwise the next page would be empty
+                        return FetchResponse(count=len(results), last=key, items=results)
+                    break
+        return FetchResponse(count=len(results), items=results)
+
+    def _any_match(self, keys: Iterable[str], match_condition) -> bool:
+        "Whether any of the records of `keys` matches"
+        for key in keys:
+            if (value := self.inventory.get(key)) is not None and match_condition(self.storage.view(key, value)):
+                return True
+        return False
 
 
 bind_methods = [
-    '__delitem__', '__setitem__', 'clear', 'get', 'pop', 'popitem', 'update', 'setdefault'
+    '__delitem__', '__setitem__', 'clear', 'pop', 'popitem', 'update', 'setdefault', 'delete_keys', 'delete_prefix',
+    'add_schema',
 ]
 
-import pathlib
-import os
+# Compact the journal once it grows past this many bytes (or past the size of the last snapshot, if bigger)
+DEFAULT_JOURNAL_LIMIT = 1024 * 1024
+# Snapshots with schemas (`RowStorage`) are `{SNAPSHOT_VERSION_KEY: 2, "schemas": [...], "records": {...}}`
+SNAPSHOT_VERSION_KEY = "__deta_orm_snapshot__"
+
 
+class DiskBaseBackend(MemoryBaseBackend, metaclass=BoundMeta, bind_methods=bind_methods):
+    """Database backend that saves to disk whenever it's modified.
 
-class DiskBaseBackend(dict, metaclass=BoundMeta, bind_methods=bind_methods):
-    """Database backend that saves to disk whenever it's modified."""
+    Every modification is appended to a journal (`<name>.journal`, one JSON list per line)
+    instead of rewriting the whole `<name>.json` snapshot, so that writes cost the same regardless of the base size.
+    On startup the snapshot is loaded and the journal replayed on top of it.
+    Once the journal grows past `DETA_ORM_JOURNAL_LIMIT` bytes, it is compacted into a new snapshot in a background thread.
+    """
 
     def __init__(self, database_name: str):
         orm_path = os.getenv("DETA_ORM_FOLDER")
@@ -156,11 +671,23 @@ class DiskBaseBackend(dict, metaclass=BoundMeta, bind_methods=bind_methods):
         if not os.path.isdir(orm_path):
             os.makedirs(orm_path)
 
+        folder = pathlib.Path(orm_path)
+        self._snapshot_path = folder / database_name
+        self._journal_path = self._snapshot_path.with_suffix('.journal')
+        # Journal being compacted into the snapshot. Only exists while (or if interrupted during) a compaction
+        self._compacting_path = self._snapshot_path.with_suffix('.journal.old')
+
         try:
-            with (pathlib.Path(orm_path) / database_name).open('r') as file:
-                super().__init__(json.load(file))
+            with self._snapshot_path.open('r') as file:
+                snapshot = json.load(file)
         except Exception:
-            super().__init__()
+            snapshot = {}
+        if snapshot.get(SNAPSHOT_VERSION_KEY) == 2:
+            super().__init__(snapshot["records"])
+            for fields in snapshot["schemas"]:
+                MemoryBaseBackend.add_schema(self, fields)
+        else:  # Written by older versions, or without any schemas
+            super().__init__(snapshot)
         self._file_name = database_name
         if os.getenv("DETA_ORM_FORMAT_NICELY", False):
             self._options = {
@@ -173,7 +700,118 @@ class DiskBaseBackend(dict, metaclass=BoundMeta, bind_methods=bind_methods):
                 "separators": (',', ':'),
             }
 
+        self._journal_limit = int(os.getenv("DETA_ORM_JOURNAL_LIMIT", DEFAULT_JOURNAL_LIMIT))
+        self._snapshot_size = self._snapshot_path.stat().st_size if self._snapshot_path.exists() else 0
+        self._lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+
+        for path in (self._compacting_path, self._journal_path):
+            self._replay(path)
+        self.key_index = KeyIndex(self)
+        if self._compacting_path.exists():  # Interrupted compaction, finish it before writing anything else
+            self._write_snapshot(dict(self), list(self.schemas))
+            self._compacting_path.unlink()
+
+        self._journal = self._journal_path.open('a', encoding='utf-8')
+        self._journal_size = self._journal.tell()
+
+    def _replay(self, path: pathlib.Path) -> None:
+        "Apply the entries of a journal file on top of the current contents"
+        if not path.exists():
+            return
+        with path.open('r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    operation, *arguments = json.loads(line)
+                except ValueError:  # Partially written entry, the process died while appending it
+                    break
+                if operation == "put":
+                    key, value = arguments
+                    dict.__setitem__(self, key, value)
+                elif operation == "del":
+                    dict.pop(self, arguments[0], None)
+                elif operation == "clear":
+                    dict.clear(self)
+                elif operation == "schema":
+                    self._replay_schema(*arguments)
+
+    def _replay_schema(self, *arguments) -> None:
+        """Apply a `["schema", index, fields]` entry. The snapshot may already have it,
+        if the process died after writing it but before removing the compacted journal."""
+        if len(arguments) == 1:  # Written by older versions, without the index
+            MemoryBaseBackend.add_schema(self, arguments[0])
+            return
+        index, fields = arguments
+        if index == len(self.schemas):
+            MemoryBaseBackend.add_schema(self, fields)
+        elif index > len(self.schemas) or self.schemas[index] != tuple(fields):
+            raise ValueError(f"Journal of {self._file_name} has schema {index} as {fields}, which does not match the snapshot")
+
+    def _journal_entries(self, method, value, *args, **kwargs) -> list:
+        "Translate a call to one of the bound methods into journal entries"
+        if method == '__setitem__' or method == 'setdefault':
+            key = args[0]
+            return [["put", key, self[key]]]
+        elif method == '__delitem__' or method == 'pop':
+            return [["del", args[0]]]
+        elif method == 'popitem':
+            return [["del", value[0]]]
+        elif method == 'update':
+            return [["put", key, self[key]] for key in dict(*args, **kwargs)]
+        elif method == 'clear':
+            return [["clear"]]
+        elif method == 'delete_keys' or method == 'delete_prefix':
+            return [["del", key] for key in value]
+        elif method == 'add_schema':
+            return [["schema", value, list(self.schemas[value])]]
+        raise ValueError(f"Unexpected method {method}")
+
     def _sync(self, method, value, *args, **kwargs):
-        with (pathlib.Path(os.getenv("DETA_ORM_FOLDER")) / self._file_name).open('w') as file:
-            json.dump(dict(self), file, **self._options)
+        entries = self._journal_entries(method, value, *args, **kwargs)
+        data = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries)
+        if not data:
+            return value
+        with self._lock:
+            self._journal.write(data)
+            self._journal.flush()
+            self._journal_size += len(data)
+            if self._journal_size > max(self._journal_limit, self._snapshot_size):
+                self._start_compaction()
         return value
+
+    def _start_compaction(self) -> None:
+        "Rotate the journal and write a new snapshot in the background. Must hold the lock."
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        snapshot = (dict(self), list(self.schemas))
+        self._journal.close()
+        os.replace(self._journal_path, self._compacting_path)
+        self._journal = self._journal_path.open('a', encoding='utf-8')
+        self._journal_size = 0
+        self._compaction = threading.Thread(target=self._compact, args=(snapshot,), daemon=True)
+        self._compaction.start()
+
+    def _compact(self, snapshot: tuple[dict, list]) -> None:
+        self._write_snapshot(*snapshot)
+        self._compacting_path.unlink()
+
+    def _write_snapshot(self, records: dict, schemas: list) -> None:
+        "Atomically replace the snapshot file"
+        temporary_path = self._snapshot_path.with_suffix('.json.tmp')
+        if schemas:
+            snapshot = {SNAPSHOT_VERSION_KEY: 2, "schemas": schemas, "records": records}
+        else:  # Same as older versions
+            snapshot = records
+        with temporary_path.open('w') as file:
+            json.dump(snapshot, file, **self._options)
+        os.replace(temporary_path, self._snapshot_path)
+        self._snapshot_size = self._snapshot_path.stat().st_size
+
+    def compact(self) -> None:
+        "Compact the journal into the snapshot right now, waiting for it to finish"
+        if self._compaction is not None:
+            self._compaction.join()
+        with self._lock:
+            self._start_compaction()
+            compaction = self._compaction
+        compaction.join()
@@ -0,0 +1,127 @@
+"""Query compiler for the local base
+
+Turns the list of filters sent to `Base.fetch` into a single predicate function.
+The generated code only depends on the *shape* of the query (which fields and operations are used),
+so it is memoized by shape and the values are bound when creating the predicate.
+
+Supports the same operations as Deta Base, including nested fields (`Field("person.name")`)
+and list values (`Field("hobbies") == ["gaming", "reading"]`, `Field("age").in_range(10, 18)`).
+"""
+
+import functools
+from typing import Callable, Optional
+
+# Python expression for each operation, where `{x}` is the field value and `{v}` the query value
+operations = {
+    None: "{x} == {v}",
+    "ne": "{x} != {v}",
+
+    "lt": "{x} < {v}",
+    "lte": "{x} <= {v}",
+    "gt": "{x} > {v}",
+    "gte": "{x} >= {v}",
+
+    "pfx": "{x}.startswith({v})",
+    "r": "{v}[0] <= {x} <= {v}[1]",
+    "contains": "{v} in {x}",
+    "not_contains": "{v} not in {x}",
+}
+
+# Conditions are evaluated from the cheapest and most selective to the most expensive
+operation_costs = {
+    None: 0,
+    "ne": 1,
+    "lt": 2, "lte": 2, "gt": 2, "gte": 2,
+    "r": 3,
+    "pfx": 4,
+    "contains": 5, "not_contains": 5,
+}
+
+
+def _resolve(record: dict, path: tuple):
+    "Looks up a nested field, returning None if any part of the path is missing"
+    value = record
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _plan_filter(filter_: dict) -> list[tuple[str, Optional[str], object]]:
+    "Splits a filter into (field, operation, value) conditions, sorted by cost"
+    conditions = []
+    for condition, value in filter_.items():
+        field, _, operation = condition.rpartition("?") if "?" in condition else (condition, None, None)
+        if operation not in operations:
+            raise ValueError(f"Unsupported query operation: {condition!r}")
+        conditions.append((field, operation, value))
+    conditions.sort(key=lambda condition: (operation_costs[condition[1]], "." in condition[0]))
+    return conditions
+
+
+# Uncompiled version of each operation, for the slow path
+_operation_functions = {
+    operation: eval(f"lambda x, v: {template.format(x='x', v='v')}")
+    for operation, template in operations.items()
+}
+
+
+def _evaluate_safely(plan: list, record: dict) -> bool:
+    "Slow path, used when a condition raises (e.g. comparing a missing field). Failing conditions do not match."
+    for conditions in plan:
+        for field, operation, value in conditions:
+            x = _resolve(record, tuple(field.split(".")))
+            try:
+                if not _operation_functions[operation](x, value):
+                    break
+            except (TypeError, AttributeError):
+                break
+        else:
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_shape(shape: tuple) -> Callable:
+    "Generates a predicate factory for one query shape. The factory takes the plan followed by every value."
+    names = []
+    branches = []
+    for conditions in shape:
+        expressions = []
+        for field, operation in conditions:
+            name = f"v{len(names)}"
+            names.append(name)
+            if "." in field:
+                x = f"_resolve(record, {tuple(field.split('.'))!r})"
+            else:
+                x = f"get({field!r})"
+            expressions.append("(" + operations[operation].format(x=x, v=name) + ")")
+        branches.append("(" + (" and ".join(expressions) or "True") + ")")
+    source = (
+        f"def factory(_plan, {', '.join(names)}):\n"
+        f"    def predicate(record):\n"
+        f"        get = record.get\n"
+        f"        try:\n"
+        f"            return {' or '.join(branches)}\n"
+        f"        except (TypeError, AttributeError):\n"
+        f"            return _evaluate_safely(_plan, record)\n"
+        f"    return predicate\n"
+    )
+    namespace = {"_resolve": _resolve, "_evaluate_safely": _evaluate_safely}
+    exec(source, namespace)
+    return namespace["factory"]
+
+
+def _match_all(record: dict) -> bool:
+    return True
+
+
+def compile_query(query: Optional[list[dict]]) -> Callable[[dict], bool]:
+    "Compiles a list of OR'ed filters into a predicate"
+    if not query:
+        return _match_all
+    plan = [_plan_filter(filter_) for filter_ in query]
+    shape = tuple(tuple((field, operation) for field, operation, _ in conditions) for conditions in plan)
+    values = [value for conditions in plan for _, _, value in conditions]
+    return _compile_shape(shape)(plan, *values)
@@ -0,0 +1,244 @@
+import asyncio
+import functools
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, Optional, Type, Union
+
+from src.database.database import (
+    RecordEncoding,
+    get_base_mode,
+    get_executor,
+    get_put_many_concurrency,
+    raise_update_error,
+)
+from src.database.exceptions import DeleteManyError, PutManyError
+from src.database.record import Record
+from src.database.query import Query
+
+from src.database._local_base import Base as LocalBase
+
+
+class _AsyncLocalBase:
+    """Exposes a local base with the same interface as Deta's `AsyncBase`
+
+    With `in_thread`, the calls run in the shared executor instead of blocking the event loop,
+    for the bases which write to disk.
+    """
+
+    def __init__(self, base: LocalBase, in_thread: bool = False):
+        self._base = base
+        self._in_thread = in_thread
+
+    async def _call(self, method: Callable, *args, **kwargs):
+        if not self._in_thread:
+            return method(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), functools.partial(method, *args, **kwargs))
+
+    async def get(self, key):
+        return await self._call(self._base.get, key)
+
+    async def insert(self, data, key=None, *, expire_in=None, expire_at=None):
+        return await self._call(self._base.insert, data, key, expire_in=expire_in, expire_at=expire_at)
+
+    async def put(self, data, key=None, *, expire_in=None, expire_at=None):
+        return await self._call(self._base.put, data, key, expire_in=expire_in, expire_at=expire_at)
+
+    async def put_many(self, items, *, expire_in=None, expire_at=None):
+        return await self._call(self._base.put_many, items, expire_in=expire_in, expire_at=expire_at)
+
+    async def update(self, updates, key):
+        return await self._call(self._base.update, updates, key)
+
+    async def delete(self, key):
+        return await self._call(self._base.delete, key)
+
+    async def delete_many(self, keys):
+        return await self._call(self._base.delete_many, keys)
+
+    async def delete_prefix(self, prefix):
+        return await self._call(self._base.delete_prefix, prefix)
+
+    async def fetch(self, query=None, *, limit=1000, last=None):
+        return await self._call(self._base.fetch, query, limit, last)
+
+    async def close(self):
+        pass
+
+
+class AsyncDatabase(RecordEncoding):
+    def __init__(
+        self,
+        name: str,
+        record_type: Optional[Type[Record]] = None,
+        *,
+        indexes: Iterable[str] = (),
+        typed_storage: bool = False,
+    ):
+        """Asynchronous counterpart of `Database`, for use in async request handlers.
+
+        Takes the same parameters as `Database`, and has the same encoding/decoding and typing rules.
+        When using Deta Base, requires `aiohttp` (used by Deta's `AsyncBase`) and must be closed with `await db.close()`.
+        The MEMORY bases run in-process, so they are called directly from the event loop.
+        The DISK bases write to their journal, so they are called from the shared executor (see `get_executor`).
+        """
+        super().__init__(record_type, typed_storage)
+        self.name = name
+        base_mode = get_base_mode()
+        self._is_local = base_mode != "DETA_BASE"
+        if base_mode == "DETA_BASE":
+            self.__base = None  # Created on first use, as it must be created inside of the event loop
+        else:
+            sync_disk = base_mode == "DISK"
+            self.__base = _AsyncLocalBase(LocalBase(name, sync_disk=sync_disk, indexes=indexes), in_thread=sync_disk)
+
+    @property
+    def _base(self):
+        if self.__base is None:
+            from deta import Deta
+            self.__base = Deta().AsyncBase(self.name)
+        return self.__base
+
+    async def close(self) -> None:
+        "Closes the connection to Deta Base"
+        if self.__base is not None:
+            await self.__base.close()
+
+    async def get(self, key: str) -> Optional[Record]:
+        """Retrieve a record based on it's key.
+        If it does not exists, returns None"""
+        data = await self._base.get(str(key))
+        if data is None:
+            return None
+        return self._decode_checked(data)
+
+    async def insert(self, key: str, data: Union[Record, dict], *, expire_in: Optional[int] = None, expire_at: Optional[datetime] = None) -> None:
+        "Insert a record. Errors if it already exists."
+        if isinstance(data, Record):
+            self._check_type(data)
+        await self._base.insert(self._encode_record(data), str(key), expire_in=expire_in, expire_at=expire_at)
+
+    async def put(self, key: str, data: Union[Record, dict], *, expire_in: Optional[int] = None, expire_at: Optional[datetime] = None) -> None:
+        "Insert a record, or overwrite it if it already exists."
+        if isinstance(data, Record):
+            self._check_type(data)
+        await self._base.put(self._encode_record(data), str(key), expire_in=expire_in, expire_at=expire_at)
+
+    async def delete(self, key: str) -> None:
+        "Deletes a record."
+        await self._base.delete(str(key))
+
+    async def put_many(
+        self,
+        data: Union[list[Union[Record, dict]], dict[str, Union[Record, dict]]],
+        *,
+        key_source: Union[str, Callable[[Union[Record, dict]], str], None] = None,
+        iter: bool = False,
+        concurrency: Optional[int] = None,
+        expire_in: Optional[int] = None,
+        expire_at: Optional[datetime] = None,
+    ) -> None:
+        "Insert or overwrite multiple records. See `Database.put_many` for the parameters."
+        records = self._encode_many(data, key_source)
+        if not records:
+            return
+        if iter:
+            chunks = [records[offset:offset+25] for offset in range(0, len(records), 25)]
+        else:
+            chunks = [records]
+        if concurrency is None:
+            concurrency = get_put_many_concurrency(self._is_local)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def put_chunk(chunk: list[dict]) -> None:
+            async with semaphore:
+                await self._base.put_many(chunk, expire_in=expire_in, expire_at=expire_at)
+
+        results = await asyncio.gather(*(put_chunk(chunk) for chunk in chunks), return_exceptions=True)
+        failures = {index: result for index, result in enumerate(results) if isinstance(result, Exception)}
+        if failures:
+            raise PutManyError(failures, [[record['key'] for record in chunk] for chunk in chunks])
+
+    async def delete_many(self, keys: Iterable[str], *, concurrency: Optional[int] = None) -> None:
+        "Deletes multiple records. See `Database.delete_many`."
+        keys = [str(key) for key in keys]
+        if self._is_local:
+            await self._base.delete_many(keys)
+            return
+        semaphore = asyncio.Semaphore(max(1, concurrency or get_put_many_concurrency(self._is_local)))
+
+        async def delete(key: str) -> None:
+            async with semaphore:
+                await self._base.delete(key)
+
+        results = await asyncio.gather(*(delete(key) for key in keys), return_exceptions=True)
+        failures = {key: result for key, result in zip(keys, results) if isinstance(result, Exception)}
+        if failures:
+            raise DeleteManyError(failures)
+
+    async def delete_prefix(self, prefix: str, *, concurrency: Optional[int] = None) -> None:
+        "Deletes every record whose key starts with `prefix`. See `Database.delete_many`."
+        if self._is_local:
+            await self._base.delete_prefix(prefix)
+            return
+        keys = [key async for key in self.iter_keys([{"key?pfx": prefix}])]
+        await self.delete_many(keys, concurrency=concurrency)
+
+    async def fetch(
+        self,
+        query: Union[Query, dict, list[dict], None] = None,
+        limit: int = 1000,
+        last: Optional[str] = None,
+        follow_last: bool = False,
+    ) -> list[Record]:
+        "Returns multiple items from the database based on a query. See `Database.fetch` for the parameters."
+        if isinstance(query, Query):
+            query = query.to_list()
+        result = await self._base.fetch(query, limit=limit, last=last)
+        records = result.items
+        if follow_last:
+            while result.last is not None and len(records) < limit:
+                result = await self._base.fetch(query, limit=limit - len(records), last=result.last)
+                records.extend(result.items)
+        return [self._decode_checked(record) for record in records]
+
+    async def iter_fetch(
+        self,
+        query: Union[Query, dict, list[dict], None] = None,
+        page_size: int = 1000,
+    ) -> AsyncIterator[Record]:
+        "Iterates over every record matching a query, fetching one page at a time."
+        if isinstance(query, Query):
+            query = query.to_list()
+        last = None
+        while True:
+            result = await self._base.fetch(query, limit=page_size, last=last)
+            for record in result.items:
+                yield self._decode_checked(record)
+            last = result.last
+            if last is None:
+                return
+
+    async def iter_keys(
+        self,
+        query: Union[Query, dict, list[dict], None] = None,
+        page_size: int = 1000,
+    ) -> AsyncIterator[str]:
+        "Iterates over the keys of every record matching a query, fetching one page at a time."
+        if isinstance(query, Query):
+            query = query.to_list()
+        last = None
+        while True:
+            result = await self._base.fetch(query, limit=page_size, last=last)
+            for record in result.items:
+                yield record['key']
+            last = result.last
+            if last is None:
+                return
+
+    async def update(self, key: str, updates: dict) -> None:
+        """Updates a Record in the database. Local representations of it might become outdated."""
+        updates = self.encode_entry(updates)
+        try:
+            await self._base.update(updates, key)
+        except Exception as err:
+            raise_update_error(err)
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from src.database._local_base import _copy
+
+DEFAULT_CACHE_SIZE = 8 * 1024 * 1024  # Bytes
+DEFAULT_CACHE_TTL = 300  # Seconds
+
+
+def _estimate_size(value) -> int:
+    "Rough size in bytes of JSON-like data, close to the size of its JSON representation"
+    if isinstance(value, str):
+        return len(value) + 2
+    elif isinstance(value, dict):
+        return 2 + sum(len(key) + 4 + _estimate_size(item) for key, item in value.items())
+    elif isinstance(value, list):
+        return 2 + sum(_estimate_size(item) + 1 for item in value)
+    return 8
+
+
+class RecordCache:
+    """Read-through cache used by `Database`, with a memory budget and LRU/TTL eviction.
+
+    Holds records by key, and the result of key prefix queries (`Field("key").startswith(...)`) by prefix.
+    Records are kept in the form returned by the base and decoded on every hit,
+    so callers modifying the Records they get (like `PokeLoader.load` does) never alter the cache.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Approximate memory budget in bytes, measured as the JSON size of the cached records.
+        Defaults to `DETA_ORM_CACHE_SIZE` (8MB).
+    ttl : float, optional
+        Seconds before an entry is considered outdated, in case another process changed it.
+        Defaults to `DETA_ORM_CACHE_TTL` (300). 0 disables the expiration.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = int(os.getenv("DETA_ORM_CACHE_SIZE", DEFAULT_CACHE_SIZE)) if max_size is None else max_size
+        self.ttl = float(os.getenv("DETA_ORM_CACHE_TTL", DEFAULT_CACHE_TTL)) if ttl is None else ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # ("key", key) or ("prefix", prefix) -> (value, size, expiration), from least to most recently used
+        self._entries: OrderedDict[tuple[str, str], tuple[object, int, Optional[float]]] = OrderedDict()
+        self._prefixes: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, entry: tuple[str, str]):
+        with self._lock:
+            cached = self._entries.get(entry)
+            if cached is not None:
+                value, _, expiration = cached
+                if expiration is None or expiration > time.monotonic():
+                    self._entries.move_to_end(entry)
+                    self.hits += 1
+                    return _copy(value)
+                self._remove(entry)
+            self.misses += 1
+            return None
+
+    def _store(self, entry: tuple[str, str], value) -> None:
+        size = _estimate_size(value)
+        if size > self.max_size:
+            return
+        expiration = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._remove(entry)
+            self._entries[entry] = (_copy(value), size, expiration)
+            self.size += size
+            if entry[0] == "prefix":
+                self._prefixes.add(entry[1])
+            while self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry: tuple[str, str]) -> None:
+        "Drops an entry. The lock must be held."
+        cached = self._entries.pop(entry, None)
+        if cached is not None:
+            self.size -= cached[1]
+            if entry[0] == "prefix":
+                self._prefixes.discard(entry[1])
+
+    def get(self, key: str) -> Optional[dict]:
+        "Returns a copy of the cached record, or None"
+        return self._lookup(("key", key))
+
+    def set(self, key: str, record: dict) -> None:
+        self._store(("key", key), record)
+
+    def get_prefix(self, prefix: str) -> Optional[list[dict]]:
+        "Returns a copy of every record whose key starts with `prefix`, or None if that query is not cached"
+        return self._lookup(("prefix", prefix))
+
+    def set_prefix(self, prefix: str, records: list[dict]) -> None:
+        self._store(("prefix", prefix), records)
+
+    def invalidate(self, keys: list[str]) -> None:
+        "Forgets these records, and the prefix queries containing them"
+        with self._lock:
+            for key in keys:
+                self._remove(("key", key))
+            for prefix in [prefix for prefix in self._prefixes if any(key.startswith(prefix) for key in keys)]:
+                self._remove(("prefix", prefix))
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        "Forgets every record whose key starts with `prefix`, and the prefix queries overlapping it"
+        with self._lock:
+            for entry in [entry for entry in self._entries if entry[0] == "key" and entry[1].startswith(prefix)]:
+                self._remove(entry)
+            for cached in [cached for cached in self._prefixes if cached.startswith(prefix) or prefix.startswith(cached)]:
+                self._remove(("prefix", cached))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._prefixes.clear()
+            self.size = 0
@@ -0,0 +1,117 @@
+"""Record codecs generated from the dataclass fields
+
+`Database.encode_entry` and `decode_entry` handle any value, checking the type of every field of every record.
+For Record classes only made of numbers and strings, which is the case of every PTD3 model,
+`compile_codec` generates an encoder and a decoder specific to that class, only checking the type of each field once.
+Their output is identical to the generic functions, and they return None for records they do not handle
+(for example, a string starting with `$`, or a field set to None), in which case the generic functions must be used.
+
+With `typed=True`, the codec is the one of a typed storage `Database`: records are encoded without
+the `__database_load_method` and `__class_name` metadata, and records with or without it can be decoded.
+"""
+
+import dataclasses
+import functools
+import typing
+from typing import Callable, NamedTuple, Optional
+
+from src.database.record import Record
+
+ESCAPE_STRING = "$NOOP"  # Same as in `database.py`
+
+# Values that Deta Base stores as-is, by annotated field type
+_passthrough_types = {
+    int: "(int, float, bool)",
+    float: "(int, float, bool)",
+    bool: "(int, float, bool)",
+    str: "(str,)",
+}
+
+
+class RecordCodec(NamedTuple):
+    encode: Callable[[Record], Optional[dict]]
+    decode: Callable[[dict], Optional[Record]]
+
+
+def _field_types(cls: type) -> Optional[dict[str, type]]:
+    "Returns the type of each field, or None if the class is not made of numbers and strings only"
+    try:
+        hints = typing.get_type_hints(cls)
+    except Exception:
+        return None
+    types = {}
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            return None
+        field_type = hints.get(field.name, field.type)
+        if field_type not in _passthrough_types:
+            return None
+        types[field.name] = field_type
+    return types
+
+
+@functools.lru_cache(maxsize=None)
+def compile_codec(cls: type, typed: bool = False) -> Optional[RecordCodec]:
+    "Generates a codec for that Record class, or returns None if it cannot have one"
+    if not (isinstance(cls, type) and issubclass(cls, Record) and dataclasses.is_dataclass(cls)):
+        return None
+    # Custom serialisation must go through the generic functions
+    if cls.to_dict is not Record.to_dict or cls.from_dict.__func__ is not Record.from_dict.__func__:
+        return None
+    types = _field_types(cls)
+    if types is None:
+        return None
+
+    names = list(types)
+    variables = [f"v{index}" for index in range(len(names))]
+    class_name = cls._database_model_name
+
+    checks = " and ".join(
+        f"{variable}.__class__ in {_passthrough_types[types[name]]}" for name, variable in zip(names, variables)
+    ) or "True"
+    encoded_values = "".join(
+        f"        {name!r}: _escape + {variable} if {variable}[:1] == '$' else {variable},\n"
+        if types[name] is str else
+        f"        {name!r}: {variable},\n"
+        for name, variable in zip(names, variables)
+    )
+    # Decoding special strings all start with `$`, leave them to the generic function
+    decode_checks = " and ".join(
+        [checks] + [f"{variable}[:1] != '$'" for name, variable in zip(names, variables) if types[name] is str]
+    )
+    if typed:  # Metadata is optional, but must match the class if present (legacy records)
+        metadata = ""
+        metadata_check = (
+            f"data.get('__class_name', {class_name!r}) != {class_name!r}"
+            f" or data.get('__database_load_method', 'Record.from_dict') != 'Record.from_dict'"
+        )
+    else:
+        metadata = (
+            f"        '__database_load_method': 'Record.from_dict',\n"
+            f"        '__class_name': {class_name!r},\n"
+        )
+        metadata_check = (
+            f"data.get('__class_name') != {class_name!r} or data.get('__database_load_method') != 'Record.from_dict'"
+        )
+    source = (
+        f"def encode(record):\n"
+        f"    {''.join(f'{variable} = record.{name}; ' for name, variable in zip(names, variables))}\n"
+        f"    if not ({checks}):\n"
+        f"        return None\n"
+        f"    return {{\n"
+        f"{encoded_values}"
+        f"{metadata}"
+        f"    }}\n"
+        f"\n"
+        f"def decode(data):\n"
+        f"    if {metadata_check}:\n"
+        f"        return None\n"
+        f"    get = data.get\n"
+        f"    {''.join(f'{variable} = get({name!r}); ' for name, variable in zip(names, variables))}\n"
+        f"    if not ({decode_checks}):\n"
+        f"        return None\n"
+        f"    return _cls({', '.join(f'{name}={variable}' for name, variable in zip(names, variables))})\n"
+    )
+    namespace = {"_cls": cls, "_escape": ESCAPE_STRING}
+    exec(source, namespace)
+    return RecordCodec(namespace["encode"], namespace["decode"])
@@ -0,0 +1,37 @@
+"""Rewrites the DISK bases in `DETA_ORM_FOLDER` with another storage format
+
+Usage: python -m src.database.convert_storage {ROWS,NATIVE,JSON} [base names...]
+
+Converts every base of the folder if no names are given.
+Bases can be read with any format regardless of the one they were written with,
+but they are only fully converted (and shrunk) once rewritten.
+"""
+
+import argparse
+import os
+import pathlib
+
+from src.database._local_base import Base, storage_formats
+
+
+def convert(name: str, storage_format: str) -> None:
+    "Rewrites the snapshot of a base with `storage_format`, including the changes still in its journal"
+    base = Base(name, sync_disk=True, storage_format=storage_format)
+    base.inventory.compact()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rewrites local DISK bases with another storage format")
+    parser.add_argument("storage_format", choices=list(storage_formats))
+    parser.add_argument("names", nargs="*", help="Bases to convert. Defaults to all of them")
+    args = parser.parse_args()
+
+    names = args.names or [path.stem for path in pathlib.Path(os.getenv("DETA_ORM_FOLDER")).glob("*.json")]
+    for name in names:
+        convert(name, args.storage_format)
+        print(f"Converted {name} to {args.storage_format}")
+    print(f"Set DETA_ORM_STORAGE_FORMAT={args.storage_format} to keep writing them in that format")
+
+
+if __name__ == "__main__":
+    main()
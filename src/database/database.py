@@ -1,17 +1,20 @@
 import os
-import itertools
-from typing import Callable, Optional, Type, Union, overload
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Type, Union, overload
 from datetime import datetime
 import inspect
 
 from deta import Base
 
-from src.database.exceptions import KeyNotFound
+from src.database.exceptions import DeleteManyError, KeyNotFound, PutManyError
 from src.database.record import (
     Record,
 
 )
 from src.database.query import Query
+from src.database.cache import RecordCache
+from src.database.codec import compile_codec
 
 from src.database._local_base import Base as LocalBase
 
@@ -21,33 +24,72 @@ EMPTY_DICTIONARY_STRING = "$EMPTY_DICT"  # Setting a field to an empty dictionar
 DATETIME_STRING = "$ENCODED_DATETIME"  # Ease datetime conversion, not that I really need of it for PTD though
 ESCAPE_STRING = "$NOOP"  # Do not mess up if the user input 'just happen' to start with a $COMMAND
 
+DEFAULT_PUT_MANY_CONCURRENCY = 8
 
-class Database(dict[str, Record]):
-    def __init__(self, name: str, record_type: Optional[Type[Record]] = None):
-        """Deta Base wrapper | ORM
-        
-        Parameters
-        ----------
-        name : str
-            Which name to use for the Deta Base
-        record_type : RecordType
-            Pass one to enforce a schema.
-            Without passing one, you can use multiple different Record classes on the same base, though that is not recommended.
-            You may either subclass the Record class or use it directly, though direct usage is not recommended
-        """
-        base_mode = os.getenv("DETA_ORM_DATABASE_MODE", "DETA_BASE")
-        if base_mode == "DETA_BASE":
-            self.__base = Base(name)
-        elif base_mode == "MEMORY":
-            self.__base = LocalBase(name, sync_disk=False)
-        elif base_mode == "DISK":
-            self.__base = LocalBase(name, sync_disk=True)
-        else:
-            raise Exception("Invalid value for DETA_ORM_DATABASE_MODE environment variable")
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class _ThreadLocalBase(threading.local):
+    "Deta Base clients keep a single connection open, which cannot be shared between threads"
+
+    def __init__(self, name: str):
+        self.base = Base(name)
 
+    def __getattr__(self, attribute: str):
+        return getattr(self.base, attribute)
+
+
+def get_base_mode() -> str:
+    "Which kind of base to use, from the `DETA_ORM_DATABASE_MODE` environment variable"
+    base_mode = os.getenv("DETA_ORM_DATABASE_MODE", "DETA_BASE")
+    if base_mode not in ("DETA_BASE", "MEMORY", "DISK"):
+        raise Exception("Invalid value for DETA_ORM_DATABASE_MODE environment variable")
+    return base_mode
+
+
+def get_put_many_concurrency(is_local: bool) -> int:
+    "How many chunks `put_many` sends at the same time by default"
+    if is_local:  # Nothing to wait for
+        return 1
+    return int(os.getenv("DETA_ORM_PUT_MANY_CONCURRENCY", DEFAULT_PUT_MANY_CONCURRENCY))
+
+
+def raise_update_error(err: Exception):
+    "Raises a KeyNotFound if `Base.update` failed because the key does not exist, otherwise re-raises the error"
+    import re
+    reason = err.args[0] if err.args else ''
+    if isinstance(reason, str) and re.fullmatch(r"Key \'.*\' not found", reason):
+        raise KeyNotFound(reason) from err
+    raise err
+
+
+def get_executor() -> ThreadPoolExecutor:
+    "Thread pool shared by every Database to send requests concurrently. Size set by `DETA_ORM_MAX_WORKERS`"
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("DETA_ORM_MAX_WORKERS", 16)),
+                thread_name_prefix="deta_orm",
+            )
+    return _executor
+
+
+class RecordEncoding:
+    """Converts Records to and from what is stored in the bases.
+
+    Shared by `Database` and `AsyncDatabase`.
+    """
+
+    def __init__(self, record_type: Optional[Type[Record]] = None, typed_storage: bool = False):
+        if typed_storage and record_type is None:
+            raise ValueError("typed_storage requires a record_type")
         self._record_type = record_type
+        self._typed_storage = typed_storage
+        self._codec = compile_codec(record_type, typed_storage) if record_type is not None else None
         self.__known_functions = {}
-    
+
     def _check_type(self, record) -> None:
         "Validates if a record matches the schema passed on class initialisation."
         if (
@@ -62,21 +104,6 @@ class Database(dict[str, Record]):
         self.__known_functions[function.__name__] = function
         self.__known_functions[function] = function.__name__
 
-    def __getitem__(self, key: str) -> Record:
-        """Retrieves an item from the database.
-        If the key if not found, raises a KeyError.
-        """
-        result = self.get(key)
-        if result is None:
-            raise KeyError(key)
-        return result
-
-    def __setitem__(self, key: str, record: Record) -> None:
-        self.put(key, record)
-    
-    def __delitem__(self, key: str) -> None:
-        self.delete(key)
-
     @overload
     def encode_entry(self, record: Union[list, tuple]) -> list: ...
     @overload
@@ -126,6 +153,18 @@ class Database(dict[str, Record]):
                 record[key] = ESCAPE_STRING + value
         return record
 
+    def _encode_record(self, record: Union[Record, dict]) -> dict:
+        "Same as `encode_entry`, using the codec generated for `record_type` when possible"
+        if self._codec is not None and type(record) is self._record_type:
+            encoded = self._codec.encode(record)
+            if encoded is not None:
+                return encoded
+        encoded = self.encode_entry(record)
+        if self._typed_storage and type(record) is self._record_type:  # Subclasses keep their metadata
+            encoded.pop('__database_load_method', None)
+            encoded.pop('__class_name', None)
+        return encoded
+
     def _load_encoded(self, record: dict) -> Union[Record, Callable]:
         "Tries to load back an encoded record field into a user defined class or function. May raise exceptions."
         method = record['__database_load_method']
@@ -178,56 +217,166 @@ class Database(dict[str, Record]):
             return self._load_encoded(record)
         return record
 
+    def _encode_many(
+        self,
+        data: Union[list[Union[Record, dict]], dict[str, Union[Record, dict]]],
+        key_source: Union[str, Callable[[Union[Record, dict]], str], None],
+    ) -> list[dict]:
+        "Encodes the arguments of `put_many` into the records sent to `Base.put_many`"
+        if isinstance(data, list):
+            if isinstance(key_source, str):
+                key_field = key_source
+                key_source = lambda record: str(getattr(record, key_field, None) or record[key_field])
+            pairs = [(key_source(record), record) for record in data]
+        elif isinstance(data, dict):
+            pairs = data.items()
+        else:
+            raise TypeError(f"Unsupported type {type(data)} passed to {self}.put_many: {data!r}")
+
+        records = []
+        for key, record in pairs:
+            self._check_type(record)
+            record = self._encode_record(record)
+            record['key'] = key
+            records.append(record)
+        return records
+
+    def _decode_checked(self, record: dict) -> Union[Record, dict]:
+        "Decodes a record returned by the base and validates its type"
+        if self._codec is not None:
+            loaded = self._codec.decode(record)
+            if loaded is not None:
+                return loaded
+        if self._typed_storage and '__database_load_method' not in record:
+            return self._record_type.from_dict(self.decode_entry(record))
+        loaded = self.decode_entry(record)
+        self._check_type(loaded)
+        return loaded
+
+
+class Database(RecordEncoding, dict[str, Record]):
+    def __init__(
+        self,
+        name: str,
+        record_type: Optional[Type[Record]] = None,
+        *,
+        indexes: Iterable[str] = (),
+        cache: Optional[RecordCache] = None,
+        typed_storage: bool = False,
+    ):
+        """Deta Base wrapper | ORM
+        
+        Parameters
+        ----------
+        name : str
+            Which name to use for the Deta Base
+        record_type : RecordType
+            Pass one to enforce a schema.
+            Without passing one, you can use multiple different Record classes on the same base, though that is not recommended.
+            You may either subclass the Record class or use it directly, though direct usage is not recommended
+        indexes : list of field names
+            Record fields to index for equality and range queries.
+            Only used by the local (MEMORY and DISK) bases, Deta Base takes care of its own indexing.
+        cache : RecordCache, optional
+            Caches the records read with `get` and key prefix queries made with `fetch`.
+            Writes made through this Database keep it up to date, but changes made by other processes
+            are only seen once the cached entries expire.
+        typed_storage : bool
+            Stores `record_type` records without their `__database_load_method` and `__class_name` metadata,
+            and decodes records lacking it directly into `record_type`. Records stored with it are still read.
+            Only use it if the base never holds plain dicts, as they would be decoded into `record_type` too.
+        """
+        self.cache = cache
+        base_mode = get_base_mode()
+        self._is_local = base_mode != "DETA_BASE"
+        if base_mode == "DETA_BASE":
+            self.__base = _ThreadLocalBase(name)
+        else:
+            self.__base = LocalBase(name, sync_disk=base_mode == "DISK", indexes=indexes)
+
+        super().__init__(record_type, typed_storage)
+
+    def __getitem__(self, key: str) -> Record:
+        """Retrieves an item from the database.
+        If the key if not found, raises a KeyError.
+        """
+        result = self.get(key)
+        if result is None:
+            raise KeyError(key)
+        return result
+
+    def __setitem__(self, key: str, record: Record) -> None:
+        self.put(key, record)
+    
+    def __delitem__(self, key: str) -> None:
+        self.delete(key)
+
     def get(self, key: str) -> Optional[Record]:
         """Retrieve a record based on it's key. 
         If it does not exists, returns None"""
-        data = self.__base.get(str(key))
+        key = str(key)
+        data = self.cache.get(key) if self.cache is not None else None
         if data is None:
-            return None
-        result = self.decode_entry(data)
-        self._check_type(result)
-        return result
+            data = self.__base.get(key)
+            if data is None:
+                return None
+            if self.cache is not None:
+                self.cache.set(key, data)
+        return self._decode_checked(data)
+
+    def _refresh_cache(self, records: list[dict], expiring: bool) -> None:
+        "Replaces the cached version of records which were just written"
+        self.cache.invalidate([record['key'] for record in records])
+        if not expiring:  # Only the base knows when they expire
+            for record in records:
+                self.cache.set(record['key'], record)
 
     def insert(self, key: str, data: Union[Record, dict], *, expire_in: Optional[int] = None, expire_at: Optional[datetime] = None) -> None:
         "Insert a record. Errors if it already exists."
         if isinstance(data, Record):
             self._check_type(data)
-            data = data.to_dict()
-        self.__base.insert(self.encode_entry(data), str(key), expire_in=expire_in, expire_at=expire_at)
+        record = self._encode_record(data)
+        self.__base.insert(record, str(key), expire_in=expire_in, expire_at=expire_at)
+        if self.cache is not None:
+            self._refresh_cache([{**record, 'key': str(key)}], expire_in is not None or expire_at is not None)
     
     def put(self, key: str, data: Union[Record, dict], *, expire_in: Optional[int] = None, expire_at: Optional[datetime] = None) -> None:
         "Insert a record, or overwrite it if it already exists."
         if isinstance(data, Record):
             self._check_type(data)
-            data = data.to_dict()
-        self.__base.put(self.encode_entry(data), str(key), expire_in=expire_in, expire_at=expire_at)
+        record = self._encode_record(data)
+        self.__base.put(record, str(key), expire_in=expire_in, expire_at=expire_at)
+        if self.cache is not None:
+            self._refresh_cache([{**record, 'key': str(key)}], expire_in is not None or expire_at is not None)
     
     def delete(self, key: str) -> None:
         "Deletes a record."
         self.__base.delete(str(key))
+        if self.cache is not None:
+            self.cache.invalidate([str(key)])
+
+    @staticmethod
+    def _in_lanes(function: Callable, arguments: list, concurrency: int) -> dict:
+        """Calls `function` with each argument, up to `concurrency` calls at the same time.
+
+        Returns the exceptions raised, by index of the argument, once all calls are done.
+        """
+        failures = {}
+        lanes = max(1, min(concurrency, len(arguments)))
 
-    def _put_many_list(self, data: list[list[Union[dict, Record]]], key_source: Callable[[Union[dict, Record]], str]) -> None:
-        for sub_list in data:
-            records = []
-            for record in sub_list:
-                self._check_type(record)
-                _key = key_source(record)
-                record = self.encode_entry(record)
-                record['key'] = _key
-                records.append(record)
-            if records:
-                self.__base.put_many(records)
-
-    def _put_many_dict(self, data: list[tuple[str, Union[dict, Record]]]) -> None:
-        for sub_dict_items in data:
-            records = []
-            for k, record in sub_dict_items:
-                self._check_type(record)
-                record = self.encode_entry(record)
-                record['key'] = k
-                records.append(record)
-            if records:
-                self.__base.put_many(records)
+        def run_lane(lane: int) -> None:
+            for index in range(lane, len(arguments), lanes):
+                try:
+                    function(arguments[index])
+                except Exception as err:
+                    failures[index] = err
+
+        # The calling thread takes care of the first lane itself
+        futures = [get_executor().submit(run_lane, lane) for lane in range(1, lanes)]
+        run_lane(0)
+        for future in futures:
+            future.result()
+        return dict(sorted(failures.items()))
 
     @overload  # Putting a dictionary of str -> Record
     def put_many(
@@ -236,6 +385,9 @@ class Database(dict[str, Record]):
         *,
         key_source: None = None,
         iter: bool = False,
+        concurrency: Optional[int] = None,
+        expire_in: Optional[int] = None,
+        expire_at: Optional[datetime] = None,
     ) -> None: ...
     @overload  # Putting a List of Records
     def put_many(
@@ -243,7 +395,10 @@ class Database(dict[str, Record]):
         data: list[Union[Record, dict]],
         *,
         key_source: Union[str, Callable[[Union[Record, dict]], str]] = None,
-        iter: bool = False
+        iter: bool = False,
+        concurrency: Optional[int] = None,
+        expire_in: Optional[int] = None,
+        expire_at: Optional[datetime] = None,
     ) -> None: ...
     def put_many(  # Actual definition
         self,
@@ -251,6 +406,9 @@ class Database(dict[str, Record]):
         *,
         key_source: Union[str, Callable[[Union[Record, dict]], str], None] = None,
         iter: bool = False,
+        concurrency: Optional[int] = None,
+        expire_in: Optional[int] = None,
+        expire_at: Optional[datetime] = None,
     ) -> None:
         """Insert or overwrite multiple records and return them. 
         Deta Base has a limit of up to 25 records at once without `iter`
@@ -269,25 +427,63 @@ class Database(dict[str, Record]):
         iter : bool, default False
             Automatically split the data into sublists of up to 25 items and put multiple times.
             If set to True, this function may use multiple HTTPS requests.
+        concurrency : int, optional
+            How many of the sublists may be sent at the same time when using `iter`.
+            Defaults to `DETA_ORM_PUT_MANY_CONCURRENCY` (8) for Deta Base, and to 1 for local bases.
+            If any of them fail, raises a `PutManyError` after all of them are done.
+        expire_in : int, optional
+            Seconds until all of the records expire
+        expire_at : datetime, optional
+            When all of the records expire
         """
-        if isinstance(data, list):
-            if iter:
-                data_chain = itertools.chain(data[offset:offset+25] for offset in range(0, len(data), 25))
-            else:
-                data_chain = [data]
-            if isinstance(key_source, str):
-                key_field = key_source
-                key_source = lambda record: str(getattr(record, key_field, None) or record[key_field])
-            self._put_many_list(data_chain, key_source)
-        elif isinstance(data, dict):
-            if iter:
-                _it = iter(data.items())
-                data_chain = (itertools.islice(_it, 25) for _ in range(((len(data)-1) // 25) + 1))
-            else:
-                data_chain = [data.items()]
-            self._put_many_dict(data_chain)
+        records = self._encode_many(data, key_source)
+        if not records:
+            return
+        if iter:
+            chunks = [records[offset:offset+25] for offset in range(0, len(records), 25)]
         else:
-            raise TypeError(f"Unsupported type {type(data)} passed to {self}.put_many: {data!r}")
+            chunks = [records]
+        if concurrency is None:
+            concurrency = get_put_many_concurrency(self._is_local)
+        put_chunk = lambda chunk: self.__base.put_many(chunk, expire_in=expire_in, expire_at=expire_at)
+        failures = self._in_lanes(put_chunk, chunks, concurrency)
+        if self.cache is not None:
+            if failures:  # Unknown state, let the next read find out
+                self.cache.invalidate([record['key'] for record in records])
+            else:
+                self._refresh_cache(records, expire_in is not None or expire_at is not None)
+        if failures:
+            raise PutManyError(failures, [[record['key'] for record in chunk] for chunk in chunks])
+
+    def delete_many(self, keys: Iterable[str], *, concurrency: Optional[int] = None) -> None:
+        """Deletes multiple records.
+
+        Local bases delete all of them at once. Deta Base has no bulk delete,
+        so it sends up to `concurrency` (by default, same as `put_many`) requests at the same time,
+        raising a DeleteManyError with the exception for every key that failed once all of them are done.
+        """
+        keys = [str(key) for key in keys]
+        if self.cache is not None:
+            self.cache.invalidate(keys)
+        if self._is_local:
+            self.__base.delete_many(keys)
+            return
+        if concurrency is None:
+            concurrency = get_put_many_concurrency(self._is_local)
+        # Looked up in each thread, as each thread has its own Deta Base client
+        delete = lambda key: self.__base.delete(key)
+        if failures := self._in_lanes(delete, keys, concurrency):
+            raise DeleteManyError({keys[index]: err for index, err in failures.items()})
+
+    def delete_prefix(self, prefix: str, *, concurrency: Optional[int] = None) -> None:
+        "Deletes every record whose key starts with `prefix`. See `delete_many`."
+        if self.cache is not None:
+            self.cache.invalidate_prefix(prefix)
+        if self._is_local:
+            self.__base.delete_prefix(prefix)
+            return
+        keys = list(self.iter_keys([{"key?pfx": prefix}]))
+        self.delete_many(keys, concurrency=concurrency)
 
     def fetch(
         self,
@@ -312,29 +508,75 @@ class Database(dict[str, Record]):
         """
         if isinstance(query, Query):
             query = query.to_list()
+        prefix = None
+        if self.cache is not None and last is None:
+            prefix = self._cached_prefix(query)
+        if prefix is not None and (records := self.cache.get_prefix(prefix)) is not None:
+            return [self._decode_checked(record) for record in records[:limit]]
+
         result = self.__base.fetch(query, limit=limit, last=last)
         records = result.items
         if follow_last:
             while result.last is not None and len(records) < limit:
-                result = self.__base.fetch(query, limit=limit, last=result.last)
+                result = self.__base.fetch(query, limit=limit - len(records), last=result.last)
                 records.extend(result.items)
 
-        result = []
-        for record in records:
-            loaded = self.decode_entry(record)
-            self._check_type(loaded)
-            result.append(loaded)
-        return result
+        if prefix is not None and result.last is None:  # Only cache complete results
+            self.cache.set_prefix(prefix, records)
+        return [self._decode_checked(record) for record in records]
+
+    @staticmethod
+    def _cached_prefix(query: Union[dict, list[dict], None]) -> Optional[str]:
+        "Returns the prefix of queries only filtering on a key prefix, which are the ones the cache keeps"
+        if isinstance(query, dict):
+            query = [query]
+        if query and len(query) == 1 and list(query[0]) == ["key?pfx"]:
+            return query[0]["key?pfx"]
+        return None
+
+    def iter_fetch(
+        self,
+        query: Union[Query, dict, list[dict], None] = None,
+        page_size: int = 1000,
+    ) -> Iterator[Record]:
+        """Iterates over every record matching a query, fetching one page at a time.
+
+        Meant for exports and sweeps over large bases, where `fetch(follow_last=True)` would load everything at once.
+        """
+        if isinstance(query, Query):
+            query = query.to_list()
+        last = None
+        while True:
+            result = self.__base.fetch(query, limit=page_size, last=last)
+            for record in result.items:
+                yield self._decode_checked(record)
+            last = result.last
+            if last is None:
+                return
+
+    def iter_keys(
+        self,
+        query: Union[Query, dict, list[dict], None] = None,
+        page_size: int = 1000,
+    ) -> Iterator[str]:
+        "Iterates over the keys of every record matching a query, fetching one page at a time."
+        if isinstance(query, Query):
+            query = query.to_list()
+        last = None
+        while True:
+            result = self.__base.fetch(query, limit=page_size, last=last)
+            for record in result.items:
+                yield record['key']
+            last = result.last
+            if last is None:
+                return
 
     def update(self, key: str, updates: dict) -> None:
         """Updates a Record in the database. Local representations of it might become outdated."""
         updates = self.encode_entry(updates)
+        if self.cache is not None:
+            self.cache.invalidate([str(key)])
         try:
             self.__base.update(updates, key)
         except Exception as err:
-            import re
-            reason = err.args[0] if err.args else ''
-            if isinstance(reason, str) and re.fullmatch(r"Key \'.*\' not found", reason):
-                raise KeyNotFound(reason)
-            else:
-                raise
+            raise_update_error(err)
@@ -1,2 +1,19 @@
 class KeyNotFound(Exception):
     "Key does not exists in the Deta Base"
+
+
+class PutManyError(Exception):
+    "Some of the chunks sent by `Database.put_many` failed"
+
+    def __init__(self, failures: dict, chunk_keys: list):
+        super().__init__(f"{len(failures)} out of {len(chunk_keys)} chunks failed: {failures}")
+        self.failures = failures  # Chunk index -> Exception
+        self.chunk_keys = chunk_keys  # Keys in each chunk
+
+
+class DeleteManyError(Exception):
+    "Some of the keys passed to `Database.delete_many` could not be deleted"
+
+    def __init__(self, failures: dict):
+        super().__init__(f"Failed to delete {len(failures)} keys: {failures}")
+        self.failures = failures  # Key -> Exception
@@ -57,15 +57,17 @@ class Field:
             f'{self.attribute}?gt': other
         }
 
-    def __lte__(self, other) -> dict:
+    def __le__(self, other) -> dict:
         return {
             f'{self.attribute}?lte': other
         }
+    __lte__ = __le__
 
-    def __gte__(self, other) -> dict:
+    def __ge__(self, other) -> dict:
         return {
             f'{self.attribute}?gte': other
         }
+    __gte__ = __ge__
 
     def startswith(self, other) -> dict:
         return {
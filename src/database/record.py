@@ -1,32 +1,54 @@
 import dataclasses
 import copy
+import sys
 import typing
 
+# Values `to_dict` can copy as-is
+_atomic_types = frozenset({int, float, bool, str, type(None)})
+
+
 class Record:
     """Base class used to interface with the Database.
 
     Direct usage is not recommended. Either:
-    - Subclass and use with dataclasses @dataclass.
+    - Subclass and use with dataclasses @dataclass, or @slotted_dataclass to save memory.
     - Subclass and overwrite `__init__`, (@classmethod) `from_dict`, `to_dict`
     """
-
+    # No `__dict__`, so that subclasses using `@slotted_dataclass` do not get one either
+    __slots__ = ()
     _known_database_models = {}
     _database_model_name = None
 
     def __init_subclass__(cls, database_model_name: typing.Optional[str] = None) -> None:
         "Register known Record classes as models for encoding/decoding database records"
         # Intentionally not using `__qualname__` to make it not care about where it is defined
-        name = database_model_name or cls.__name__
-        if (existing_model := Record._known_database_models.get(name)) is not None:
+        # Classes recreated to add `__slots__` keep the name of the original class
+        name = database_model_name or cls.__dict__.get('_database_model_name') or cls.__name__
+        if (existing_model := Record._known_database_models.get(name)) is not None and not _adds_slots(existing_model, cls):
             raise Exception(f"Cannot create class {cls} with same database model name as {existing_model=}")
         Record._known_database_models[name] = cls
         cls._database_model_name = name
+        # Generated on first use, as `@dataclass` only adds the fields after the class is created
+        cls._record_functions = None
+
+    def __new__(cls, *args, **kwargs):
+        # `Record(...)` itself needs a `__dict__` to hold its attributes
+        return object.__new__(_DictRecord if cls is Record else cls)
 
     def __init__(self, **kwargs):
         "Direct usage of the Record class is not advisable."
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    @classmethod
+    def _get_record_functions(cls) -> typing.Optional[tuple]:
+        "Returns the generated (to_dict, from_dict) functions of this dataclass, or None if it is not one"
+        if '_record_functions' not in cls.__dict__:  # Record itself
+            return None
+        if cls._record_functions is None:
+            cls._record_functions = _generate_record_functions(cls) or ()
+        return cls._record_functions or None
+
     @classmethod
     def from_dict(cls, data: dict, *, strict: bool = True) -> 'Record':
         """
@@ -34,6 +56,13 @@ class Record:
 
         Use `strict=False` if you want to fill in missing fields with `None` instead of using the default value or raising an error
         """
+        if (functions := cls._get_record_functions()) is not None:
+            return functions[1](data, strict)
+        return cls._from_dict(data, strict=strict)
+
+    @classmethod
+    def _from_dict(cls, data: dict, *, strict: bool = True) -> 'Record':
+        "Generic version of `from_dict`"
         if dataclasses.is_dataclass(cls):
             if strict:  # Strict: If it is None, use the class's default value (or error if there isn't one)
                 data = {
@@ -45,7 +74,7 @@ class Record:
                     field.name: data.get(field.name) for field in dataclasses.fields(cls)
                 }
         else:
-            data = {k: v for k, v in data if not k.startswith("_")}
+            data = {k: v for k, v in data.items() if not k.startswith("_")}
         try:
             return cls(**data)
         except TypeError:
@@ -53,16 +82,112 @@ class Record:
 
     def to_dict(self) -> dict:
         "Converts into a dictionary fit for storing in the Deta Base"
+        if (functions := self._get_record_functions()) is not None:
+            return functions[0](self)
+        return self._to_dict()
+
+    def _to_dict(self) -> dict:
+        "Generic version of `to_dict`"
         data = copy.copy(self)
-        for attr, val in vars(data).items():
+        for attr, val in _attributes(data).items():
             if isinstance(val, Record):
                 setattr(data, attr, val.to_dict())
         if dataclasses.is_dataclass(data):
             data = dataclasses.asdict(data)
         else:
-            data = {k: v for k, v in vars(data).items() if not k.startswith("_")}
+            data = {k: v for k, v in _attributes(data).items() if not k.startswith("_")}
 
         data["__database_load_method"] = "Record.from_dict"
         data["__class_name"] = self._database_model_name
 
         return data
+
+
+class _DictRecord(Record):
+    "What `Record(...)` creates, as `Record` has no `__dict__`"
+
+
+# Stored as a plain `Record`, not as a model of its own
+del Record._known_database_models[_DictRecord._database_model_name]
+_DictRecord._database_model_name = None
+
+
+def _attributes(record: Record) -> dict:
+    "Same as `vars(record)`, but also supports classes using `__slots__`"
+    attributes = dict(getattr(record, '__dict__', {}))
+    for cls in type(record).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if name not in ('__dict__', '__weakref__') and hasattr(record, name):
+                attributes[name] = getattr(record, name)
+    return attributes
+
+
+def _adds_slots(existing: type, cls: type) -> bool:
+    "Whether `cls` is a copy of `existing` with `__slots__`, as made by `@slotted_dataclass`"
+    return (
+        existing.__module__ == cls.__module__
+        and existing.__name__ == cls.__name__
+        and '__slots__' in cls.__dict__
+        and '__slots__' not in existing.__dict__
+    )
+
+
+def slotted_dataclass(cls: typing.Optional[type] = None, /, **kwargs):
+    """Same as `@dataclass(slots=True)`, which is only available on Python 3.10+
+
+    Fields are stored in slots rather than in a `__dict__`, which makes instances smaller.
+    Must be used on Record subclasses, and as for `@dataclass(slots=True)`,
+    this replaces the class by a copy which has the `__slots__`.
+    """
+    def wrap(cls: type) -> type:
+        if sys.version_info >= (3, 10):
+            return dataclasses.dataclass(cls, slots=True, **kwargs)
+        cls = dataclasses.dataclass(cls, **kwargs)
+        namespace = dict(cls.__dict__)
+        field_names = tuple(field.name for field in dataclasses.fields(cls))
+        namespace['__slots__'] = field_names
+        for name in (*field_names, '__dict__', '__weakref__'):
+            namespace.pop(name, None)  # Defaults are kept by `__init__`
+        slotted = type(cls)(cls.__name__, cls.__bases__, namespace)
+        slotted.__qualname__ = cls.__qualname__
+        return slotted
+
+    return wrap if cls is None else wrap(cls)
+
+
+def _generate_record_functions(cls: type) -> typing.Optional[tuple]:
+    """Generates `to_dict` and `from_dict` for a dataclass, using the precomputed list of fields
+
+    They fall back to the generic versions for anything other than plain values (such as nested Records or lists),
+    for fields set to None when using strict mode, and for classes with fields excluded from `__init__`.
+    """
+    if not dataclasses.is_dataclass(cls):
+        return None
+    fields = dataclasses.fields(cls)
+    if any(not field.init for field in fields):
+        return None
+    names = tuple(field.name for field in fields)
+    variables = [f"v{index}" for index in range(len(names))]
+    loads = ''.join(f'{variable} = self.{name}; ' for name, variable in zip(names, variables))
+    gets = ''.join(f'{variable} = get({name!r}); ' for name, variable in zip(names, variables))
+    source = (
+        f"def to_dict(self):\n"
+        f"    {loads}\n"
+        f"    if not ({' and '.join(f'{variable}.__class__ in _atomic_types' for variable in variables) or 'True'}):\n"
+        f"        return self._to_dict()\n"
+        f"    return {{{''.join(f'{name!r}: {variable}, ' for name, variable in zip(names, variables))}"
+        f"'__database_load_method': 'Record.from_dict', '__class_name': self._database_model_name}}\n"
+        f"\n"
+        f"def from_dict(data, strict):\n"
+        f"    get = data.get\n"
+        f"    {gets}\n"
+        f"    if strict and ({' or '.join(f'{variable} is None' for variable in variables) or 'False'}):\n"
+        f"        return _cls._from_dict(data, strict=strict)\n"
+        f"    try:\n"
+        f"        return _cls({', '.join(f'{name}={variable}' for name, variable in zip(names, variables))})\n"
+        f"    except TypeError:\n"
+        f"        return _cls._from_dict(data, strict=strict)\n"
+    )
+    namespace = {"_cls": cls, "_atomic_types": _atomic_types}
+    exec(source, namespace)
+    return namespace["to_dict"], namespace["from_dict"]
@@ -1,29 +1,224 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
 from uuid import uuid4
 from urllib.parse import unquote
 
 from werkzeug.datastructures import ImmutableMultiDict
 
-from src.models.networking import Request
-
 from src.models.extras_2 import ExtraInfoLoader, ExtraInfo
 from src.models.pokemon import PokeLoader, Pokemon
 from src.models.items import ItemsLoader, Item
 from src.models.profile import ProfileLoader, Profile
 
-from src.database import Database, Query, Field
+from src.database import Database, Query, Field, RecordCache, get_executor
+from src.database.database import get_base_mode
 
-profile_base = Database("ptd3_profiles_database", record_type=Profile)
 
-extra_base = Database("ptd3_extra_info_database", record_type=ExtraInfo)
-poke_base = Database("ptd3_pokemon_database", record_type=Pokemon)
-item_base = Database("ptd3_item_database", record_type=Item)
+def get_cache_enabled() -> bool:
+    """Whether to cache records and responses in memory, from the `PTD3_CACHE` environment variable (1 or 0)
 
+    Caches are only invalidated by the process that changes a save, so they are off by default in DETA_BASE mode,
+    where several server instances may write the same saves. Defaults to on with the local (MEMORY and DISK) bases.
+    """
+    cache_enabled = os.getenv("PTD3_CACHE", "0" if get_base_mode() == "DETA_BASE" else "1")
+    if cache_enabled not in ("0", "1"):
+        raise Exception("Invalid value for PTD3_CACHE environment variable")
+    return cache_enabled == "1"
 
-def get_profiles_list(data: ImmutableMultiDict[str, str]) -> dict:
-    result = {}
+
+def make_cache() -> Optional[RecordCache]:
+    "A cache for one of the bases, or None if caching is disabled"
+    return RecordCache() if get_cache_enabled() else None
+
+
+# These bases only hold their `record_type`, so they are stored without per-record type metadata
+profile_base = Database("ptd3_profiles_database", record_type=Profile, cache=make_cache(), typed_storage=True)
+
+extra_base = Database("ptd3_extra_info_database", record_type=ExtraInfo, cache=make_cache(), typed_storage=True)
+poke_base = Database(
+    "ptd3_pokemon_database",
+    record_type=Pokemon,
+    indexes=["pokedex_num", "poke_extra"],
+    cache=make_cache(),
+    typed_storage=True,
+)
+item_base = Database("ptd3_item_database", record_type=Item, cache=make_cache(), typed_storage=True)
+
+# Whole saves (extras, pokemons and items) as a single document, split in parts. Used by the DOCUMENT layout.
+story_base = Database("ptd3_story_database", cache=make_cache())
+
+BACKUP_EXPIRATION = 7 * 24 * 60 * 60  # Deleted pokemons are kept for a week
+# Deta Base records are limited to 400KB, the rest is left for the key and the item's metadata
+DOCUMENT_PART_SIZE = 350 * 1024
+
+
+class StoryProfileCache:
+    """Keeps the encoded `loadStoryProfile` responses of the most recently loaded profiles.
+
+    Each profile has a version, bumped when its save changes, so that a load which started before
+    a save finished cannot store an outdated response.
+    Only the versions of the `max_profiles` most recently changed profiles are kept, the others share `_base_version`,
+    which is bumped whenever one is dropped so that the loads that read it beforehand are not stored.
+    Nothing is cached if `max_profiles` is 0.
+    """
+
+    def __init__(self, max_profiles: int = 1024, ttl: float = 300):
+        self.max_profiles = max_profiles
+        self.ttl = ttl  # In case another server instance changed the save
+        self._responses: OrderedDict[str, tuple[object, float]] = OrderedDict()
+        self._versions: OrderedDict[str, int] = OrderedDict()
+        self._base_version = 0
+        self._last_version = 0  # Versions only increase, including across profiles
+        self._lock = threading.Lock()
+
+    def get(self, profile_key: str) -> Optional[object]:
+        with self._lock:
+            cached = self._responses.get(profile_key)
+            if cached is None:
+                return None
+            if cached[1] <= time.monotonic():
+                del self._responses[profile_key]
+                return None
+            self._responses.move_to_end(profile_key)
+            return cached[0]
+
+    def version(self, profile_key: str) -> int:
+        "Read before building a response, and passed to `set`"
+        with self._lock:
+            return self._versions.get(profile_key, self._base_version)
+
+    def set(self, profile_key: str, response: object, version: int) -> None:
+        with self._lock:
+            if not self.max_profiles or self._versions.get(profile_key, self._base_version) != version:
+                return
+            self._responses[profile_key] = (response, time.monotonic() + self.ttl)
+            self._responses.move_to_end(profile_key)
+            while len(self._responses) > self.max_profiles:
+                self._responses.popitem(last=False)
+
+    def invalidate(self, profile_key: str) -> None:
+        with self._lock:
+            self._responses.pop(profile_key, None)
+            self._last_version += 1
+            self._versions[profile_key] = self._last_version
+            self._versions.move_to_end(profile_key)
+            if len(self._versions) > self.max_profiles:
+                self._versions.popitem(last=False)
+                self._last_version += 1
+                self._base_version = self._last_version
+
+
+# Disabled along with the record caches, as it is only invalidated by this process too
+story_profile_cache = StoryProfileCache(max_profiles=1024 if get_cache_enabled() else 0)
+
+
+def get_username(data: ImmutableMultiDict[str, str]) -> str:
     username = data.get("Account")
     if username is None:
         username = unquote(data['Email']).rsplit('/', 1)[-1]
+    return username
+
+
+def get_profile_key(data: ImmutableMultiDict[str, str]) -> str:
+    return f"{get_username(data)}${data['whichProfile']}"
+
+
+def get_save_layout() -> str:
+    """How the saves are stored, from the `PTD3_SAVE_LAYOUT` environment variable:
+
+    - RECORDS (default): One record per extra, pokemon and item, in their respective bases
+    - DOCUMENT: One document per save in `story_base`, split in parts of up to `DOCUMENT_PART_SIZE` bytes
+
+    Profiles are stored in `profile_base` with either layout. Use `src.migrate_saves` to change existing saves' layout.
+    """
+    save_layout = os.getenv("PTD3_SAVE_LAYOUT", "RECORDS")
+    if save_layout not in ("RECORDS", "DOCUMENT"):
+        raise Exception("Invalid value for PTD3_SAVE_LAYOUT environment variable")
+    return save_layout
+
+
+def in_parallel(*calls: Callable) -> list:
+    """Runs independent base calls concurrently, returning their results in order
+
+    The first call runs in the calling thread and the others in the shared executor,
+    so only the first one may itself wait on the executor (such as `put_many`).
+    """
+    futures = [get_executor().submit(call) for call in calls[1:]]
+    return [calls[0](), *(future.result() for future in futures)]
+
+
+def fetch_profile_records(base: Database, profile_key: str) -> Callable[[], list]:
+    "Returns a function fetching every record of the profile in that base, meant for `in_parallel`"
+    return lambda: base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
+
+
+def read_save_records(profile_key: str) -> tuple[list[ExtraInfo], list[Pokemon], list[Item]]:
+    "Reads a save stored with the RECORDS layout"
+    return tuple(in_parallel(
+        fetch_profile_records(extra_base, profile_key),
+        fetch_profile_records(poke_base, profile_key),
+        fetch_profile_records(item_base, profile_key),
+    ))
+
+
+def read_save_document(profile_key: str) -> tuple[list[ExtraInfo], list[Pokemon], list[Item], int]:
+    "Reads a save stored with the DOCUMENT layout, returning its extras, pokemons, items and number of parts"
+    parts = story_base.fetch(Query(Field("key").startswith(f"{profile_key}$")), follow_last=True)
+    extras, pokemons, items = [], [], []
+    for part in parts:
+        extras.extend(part['extras'])
+        pokemons.extend(part['pokemons'])
+        items.extend(part['items'])
+    return extras, pokemons, items, len(parts)
+
+
+def split_save_document(extras: list[ExtraInfo], pokemons: list[Pokemon], items: list[Item]) -> list[dict]:
+    "Splits a save in parts of up to `DOCUMENT_PART_SIZE` bytes once encoded, with the extras and items in the first one"
+    def encoded_size(value) -> int:
+        # ASCII only, so at least as long as the UTF-8 Deta Base counts
+        return len(json.dumps(story_base.encode_entry(value)))
+
+    part = {"extras": extras, "pokemons": [], "items": items}
+    size = encoded_size(part)
+    parts = [part]
+    for pokemon in pokemons:
+        pokemon_size = encoded_size(pokemon) + 2  # With the separator
+        if part["pokemons"] and size + pokemon_size > DOCUMENT_PART_SIZE:
+            part = {"extras": [], "pokemons": [], "items": []}
+            size = encoded_size(part)
+            parts.append(part)
+        part["pokemons"].append(pokemon)
+        size += pokemon_size
+    return parts
+
+
+def write_save_document(
+    profile_key: str,
+    extras: list[ExtraInfo],
+    pokemons: list[Pokemon],
+    items: list[Item],
+    previous_parts: int = 0,
+) -> None:
+    """Overwrites a save with the DOCUMENT layout, in a single `put_many` unless it shrunk
+
+    Waits on the shared executor, so it must not run in it (first call of `in_parallel` only).
+    """
+    parts = {
+        f"{profile_key}${index:03}": part
+        for index, part in enumerate(split_save_document(extras, pokemons, items))
+    }
+    story_base.put_many(parts, iter=True)
+    if previous_parts > len(parts):
+        story_base.delete_many(f"{profile_key}${index:03}" for index in range(len(parts), previous_parts))
+
+
+def get_profiles_list(data: ImmutableMultiDict[str, str]) -> dict:
+    result = {}
+    username = get_username(data)
 
     profiles: list[Profile] = profile_base.fetch(Query(Field("key").startswith(username)))
     data = ProfileLoader.encode_profiles(profiles, result)
@@ -32,15 +227,20 @@ def get_profiles_list(data: ImmutableMultiDict[str, str]) -> dict:
 
 
 def get_story_profile(data: ImmutableMultiDict[str, str]) -> dict:
-    username = data.get("Account")
-    if username is None:
-        username = unquote(data['Email']).rsplit('/', 1)[-1]
-    profile_key = f"{username}${data['whichProfile']}"
+    profile_key = get_profile_key(data)
 
-    profile = profile_base.get(profile_key)
-    extras = extra_base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
-    pokemons = poke_base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
-    items = item_base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
+    if get_save_layout() == "DOCUMENT":
+        profile, (extras, pokemons, items, _) = in_parallel(
+            lambda: profile_base.get(profile_key),
+            lambda: read_save_document(profile_key),
+        )
+    else:
+        profile, extras, pokemons, items = in_parallel(
+            lambda: profile_base.get(profile_key),
+            fetch_profile_records(extra_base, profile_key),
+            fetch_profile_records(poke_base, profile_key),
+            fetch_profile_records(item_base, profile_key),
+        )
     result = dict()
     result['extra'] = ProfileLoader.encode_story_profile(profile, result)
     result['extra2'] = ExtraInfoLoader.encode_story_extras(extras, result)
@@ -56,77 +256,118 @@ def set_save_data(data: ImmutableMultiDict[str, str]) -> dict:
         outer_key: part
         for outer_key, part in (x.split('=') for x in unquote(data["extra"]).split('&'))
     }
-    username = data.get("Account")
-    if username is None:
-        username = unquote(data['Email']).rsplit('/', 1)[-1]
-    profile_key = f"{username}${data['whichProfile']}"
+    profile_key = get_profile_key(data)
+    story_profile_cache.invalidate(profile_key)
 
-    profile = profile_base.get(profile_key)
-    saved_pokemons = poke_base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
+    save_layout = get_save_layout()
+    if save_layout == "DOCUMENT":
+        profile, (saved_extras, saved_pokemons, saved_items, saved_parts) = in_parallel(
+            lambda: profile_base.get(profile_key),
+            lambda: read_save_document(profile_key),
+        )
+    else:
+        profile, saved_extras, saved_pokemons, saved_items = in_parallel(
+            lambda: profile_base.get(profile_key),
+            fetch_profile_records(extra_base, profile_key),
+            fetch_profile_records(poke_base, profile_key),
+            fetch_profile_records(item_base, profile_key),
+        )
     profile: Profile = ProfileLoader.update_profile(profile, profile_meta)
     profile.profile_id = data['whichProfile']  # not part of the proper `extra` metadata
 
     _poke_nicks = {int(key.removeprefix('PokeNick')): value for key, value in profile_meta.items() if
                    key.startswith('PokeNick')}
 
-    extras = ExtraInfoLoader(data=data['extra2'], infos=[])
+    extras = ExtraInfoLoader(data=data['extra2'], infos=saved_extras)
     pokemons = PokeLoader(data=data['extra3'], pokemons=saved_pokemons, poke_nicks=_poke_nicks)
-    items = ItemsLoader(data=data['extra4'], items=[])
+    items = ItemsLoader(data=data['extra4'], items=saved_items)
     # extra5 => current save key ; only used for the checkSum, which we ignore
 
     extras.load()
     pokemons.load()
     items.load()
 
-    profile_base[profile_key] = profile
+    if pokemons.to_delete:
+        # Keep a backup to permit manual recovery
+        poke_base.put_many(
+            pokemons.to_delete,
+            key_source=lambda record: f"backup_save$0${uuid4()}",
+            iter=True,
+            expire_in=BACKUP_EXPIRATION,
+        )
 
-    extra_base.put_many(
-        extras.infos,
-        key_source=lambda record: f"{profile_key}${record.info_id}",
-    )
+    changed = any((
+        extras.to_update, pokemons.to_insert, pokemons.to_update, pokemons.to_delete, items.to_update, items.to_delete,
+    ))
+    if save_layout == "DOCUMENT" and not changed:
+        profile_base[profile_key] = profile
+    elif save_layout == "DOCUMENT":
+        released = {id(poke) for poke in pokemons.to_delete}
+        in_parallel(
+            lambda: write_save_document(
+                profile_key,
+                extras.infos,
+                [poke for poke in saved_pokemons if id(poke) not in released] + pokemons.to_insert,
+                items.items,
+                saved_parts,
+            ),
+            lambda: profile_base.put(profile_key, profile),
+        )
+    else:
+        profile_base[profile_key] = profile
 
-    poke_base.put_many(
-        pokemons.to_insert + pokemons.to_update,
-        key_source=lambda record: f"{profile_key}${record.poke_save_id}",
-        iter=True,
-    )
-    for poke in pokemons.to_delete:
-        poke_base.delete(f"{profile_key}${poke.poke_save_id}")
-        # Keep a backup to permit manual recovery
-        poke_base.put(f"backup_save$0${uuid4()}", poke, expire_in=7 * 24 * 60 * 60)
+        extra_base.put_many(
+            extras.to_update,
+            key_source=lambda record: f"{profile_key}${record.info_id}",
+            iter=True,
+        )
 
-    item_base.put_many(
-        items.items,
-        key_source=lambda record: f"{profile_key}${record.item_id}",
-        iter=True,
-    )
+        poke_base.put_many(
+            pokemons.to_insert + pokemons.to_update,
+            key_source=lambda record: f"{profile_key}${record.poke_save_id}",
+            iter=True,
+        )
+        if pokemons.to_delete:
+            poke_base.delete_many(f"{profile_key}${poke.poke_save_id}" for poke in pokemons.to_delete)
 
+        if items.to_delete:
+            item_base.delete_many(f"{profile_key}${item.item_id}" for item in items.to_delete)
+        item_base.put_many(
+            items.to_update,
+            key_source=lambda record: f"{profile_key}${record.item_id}",
+            iter=True,
+        )
+
+    story_profile_cache.invalidate(profile_key)
     result = {}
     for pokemon in pokemons.to_insert:  # Return the newly created Save IDs
         result[f'PID{pokemon.poke_party_pos}'] = pokemon.poke_save_id
     return result
 
 
-def delete_save_data(request: Request) -> dict:
+def delete_save_data(data: ImmutableMultiDict[str, str]) -> dict:
     "Deletes the profile related save data"
-    username = request.data.get("Account")
-    if username is None:
-        username = unquote(request.data['Email']).rsplit('/', 1)[-1]
-    profile_key = f"{username}${request.data['whichProfile']}"
+    profile_key = get_profile_key(data)
+    story_profile_cache.invalidate(profile_key)
 
-    saved_pokemons = poke_base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
-    saved_extras = extra_base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
-    saved_items = item_base.fetch(Query(Field("key").startswith(profile_key)), follow_last=True)
+    save_layout = get_save_layout()
+    if save_layout == "DOCUMENT":
+        _, saved_pokemons, _, _ = read_save_document(profile_key)
+    else:
+        saved_pokemons = poke_base.fetch(Query(Field("key").startswith(f"{profile_key}$")), follow_last=True)
 
     del profile_base[profile_key]
 
-    for poke in saved_pokemons:
-        poke_base.delete(f"{profile_key}${poke.poke_save_id}")
-        # Keep a backup to permit manual recovery
-        poke_base.put(f"backup_save$0${uuid4()}", poke, expire_in=7 * 24 * 60 * 60)
-
-    for extra in saved_extras:
-        extra_base.delete(f"{profile_key}${extra.info_id}")
-
-    for item in saved_items:
-        item_base.delete(f"{profile_key}${item.item_id}")
+    # Keep a backup to permit manual recovery
+    poke_base.put_many(
+        saved_pokemons,
+        key_source=lambda record: f"backup_save$0${uuid4()}",
+        iter=True,
+        expire_in=BACKUP_EXPIRATION,
+    )
+    if save_layout == "DOCUMENT":
+        story_base.delete_prefix(f"{profile_key}$")
+    else:
+        for base in (poke_base, extra_base, item_base):
+            base.delete_prefix(f"{profile_key}$")
+    story_profile_cache.invalidate(profile_key)
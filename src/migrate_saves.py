@@ -0,0 +1,61 @@
+"""Moves existing saves between the layouts described in `manage_save.get_save_layout`
+
+Usage: python -m src.migrate_saves {DOCUMENT,RECORDS} [--delete]
+
+Reads every save stored in the other layout and writes it with the target layout.
+With `--delete`, the old copy is removed once written, otherwise it is kept as-is.
+Set `PTD3_SAVE_LAYOUT` to the target layout once done.
+"""
+
+import argparse
+
+from src.manage_save import (
+    profile_base,
+    extra_base,
+    poke_base,
+    item_base,
+    story_base,
+    story_profile_cache,
+    read_save_records,
+    read_save_document,
+    write_save_document,
+)
+
+
+def to_document(profile_key: str, delete: bool = False) -> None:
+    "Copies one save from the RECORDS layout to the DOCUMENT layout"
+    extras, pokemons, items = read_save_records(profile_key)
+    _, _, _, previous_parts = read_save_document(profile_key)
+    write_save_document(profile_key, extras, pokemons, items, previous_parts)
+    if delete:
+        for base in (extra_base, poke_base, item_base):
+            base.delete_prefix(f"{profile_key}$")
+    story_profile_cache.invalidate(profile_key)
+
+
+def to_records(profile_key: str, delete: bool = False) -> None:
+    "Copies one save from the DOCUMENT layout to the RECORDS layout"
+    extras, pokemons, items, _ = read_save_document(profile_key)
+    extra_base.put_many(extras, key_source=lambda record: f"{profile_key}${record.info_id}", iter=True)
+    poke_base.put_many(pokemons, key_source=lambda record: f"{profile_key}${record.poke_save_id}", iter=True)
+    item_base.put_many(items, key_source=lambda record: f"{profile_key}${record.item_id}", iter=True)
+    if delete:
+        story_base.delete_prefix(f"{profile_key}$")
+    story_profile_cache.invalidate(profile_key)
+
+
+def migrate(layout: str, delete: bool = False) -> int:
+    "Migrates every save to `layout`, returning how many were migrated"
+    migrate_profile = to_document if layout == "DOCUMENT" else to_records
+    profile_keys = list(profile_base.iter_keys())
+    for profile_key in profile_keys:
+        migrate_profile(profile_key, delete)
+    return len(profile_keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moves existing saves to another layout")
+    parser.add_argument("layout", choices=["DOCUMENT", "RECORDS"], help="Layout to migrate the saves to")
+    parser.add_argument("--delete", action="store_true", help="Delete the saves in the old layout once migrated")
+    args = parser.parse_args()
+    print(f"Migrated {migrate(args.layout, args.delete)} saves to the {args.layout} layout")
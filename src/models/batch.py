@@ -0,0 +1,248 @@
+"""Decodes and encodes many save strings at once, with NumPy
+
+Optional: requires `numpy`, which the server itself does not use, so it is not in the project dependencies
+and must be installed separately (`pip install numpy`). Meant for migrations, audits and analytics,
+where going through a `DataExtractor` for each of thousands of strings is too slow.
+
+Handles the strings made of a count followed by that many records of one `WireFormat`,
+like the `extra3` of `loadStoryProfile` (`STORY_POKEMON_FORMAT`) and `extra2`/`extra4`
+(`EXTRA_INFO_FORMAT`/`ITEM_FORMAT`). Records are decoded into columns, one array per field,
+with the records of every string one after the other.
+
+The strings are parsed in lockstep: each step reads one field of one record of every string,
+so the larger the batch, the faster it is per string. Each step has a fixed cost, so once fewer than
+`MIN_LOCKSTEP_STRINGS` strings have records left (such as for a few large boxes), the rest of them is read
+one string at a time with the `WireFormat` reader instead, which is faster there.
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+from src.models.extractor import DataExtractor, translate_key
+from src.models.wire_format import WireFormat, DIGIT, NUMBER, DOUBLE_NUMBER, STRING
+
+_DECODE_TABLE = np.arange(256, dtype=np.uint8)
+_ENCODE_TABLE = np.arange(256, dtype=np.uint8)
+for _numeric, _letter in translate_key:
+    _DECODE_TABLE[ord(_letter)] = ord(_numeric)
+    _ENCODE_TABLE[ord(_numeric)] = ord(_letter)
+
+MAX_DIGITS = 18  # Larger values do not fit in an int64
+# Below this many strings, a lockstep step costs more than reading their records one by one (see benchmarks.batch)
+MIN_LOCKSTEP_STRINGS = 48
+_POWERS_OF_TEN = 10 ** np.arange(MAX_DIGITS + 1, dtype=np.int64)
+
+
+def _check_format(wire_format: WireFormat) -> None:
+    for field in wire_format.fields:
+        if field.read is not None or field.write is not None:
+            raise ValueError(f"Batch decoding does not support fields with conversions: {field}")
+        if field.kind not in (DIGIT, NUMBER, DOUBLE_NUMBER, STRING):
+            raise ValueError(f"Unknown wire field kind {field.kind!r}")
+
+
+def _translate(strings: Sequence[str], table: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    "Translates every string through `table`, returning them as one buffer and the offset of each string in it"
+    sizes = np.fromiter((len(string) for string in strings), dtype=np.int64, count=len(strings))
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    buffer = np.frombuffer("".join(strings).encode("ascii"), dtype=np.uint8)
+    return table[buffer], offsets
+
+
+def translate(strings: Sequence[str], *, decoding: bool) -> list[str]:
+    "Same as `extractor.decode` (or `encode` if not `decoding`) applied to every string"
+    buffer, offsets = _translate(strings, _DECODE_TABLE if decoding else _ENCODE_TABLE)
+    joined = buffer.tobytes().decode("ascii")
+    return [joined[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def _parse(digits: np.ndarray, starts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    "Parses the `sizes[i]` digits at `starts[i]` of `digits`, for every i"
+    if sizes.size and sizes.max() > MAX_DIGITS:
+        raise OverflowError(f"Cannot decode numbers of more than {MAX_DIGITS} digits")
+    values = np.zeros(starts.shape, dtype=np.int64)
+    for offset in range(int(sizes.max(initial=0))):
+        reading = sizes > offset
+        digit = digits.take(starts + offset, mode="clip")
+        values = np.where(reading, values * 10 + digit, values)
+    return values
+
+
+def _read(kind: str, buffer: np.ndarray, digits: np.ndarray, positions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    "Reads one value of `kind` at each position, returning the values and the positions after them"
+    if kind == DIGIT:
+        return digits.take(positions, mode="clip"), positions + 1
+    sizes = digits.take(positions, mode="clip")
+    if kind == NUMBER:
+        return _parse(digits, positions + 1, sizes), positions + 1 + sizes
+    elif kind == DOUBLE_NUMBER:
+        starts = positions + 1 + sizes
+        sizes = _parse(digits, positions + 1, sizes)
+        return _parse(digits, starts, sizes), starts + sizes
+    # STRING
+    width = max(int(sizes.max(initial=0)), 1)
+    indexes = positions[:, None] + 1 + np.arange(width)
+    characters = np.where(np.arange(width) < sizes[:, None], buffer.take(indexes, mode="clip"), 0)
+    strings = np.ascontiguousarray(characters.astype(np.uint8)).view(f"S{width}").ravel()
+    return strings.astype(str), positions + 1 + sizes
+
+
+def _read_rest(
+    string: str, wire_format: WireFormat, columns: dict[str, np.ndarray],
+    positions: np.ndarray, offsets: np.ndarray, rows: np.ndarray, counts: np.ndarray, index: int, record: int,
+) -> None:
+    "Reads the records of the `index`-th string from the `record`-th one with the scalar reader, into the columns"
+    extractor = DataExtractor(string)
+    extractor.current_index = int(positions[index] - offsets[index])
+    read = wire_format.read
+    try:
+        records = [read(extractor) for _ in range(record, int(counts[index]))]
+    except (ValueError, IndexError) as err:
+        raise ValueError("Some strings end before their last record") from err
+    target = slice(int(rows[index]) + record, int(rows[index] + counts[index]))
+    for name, values in zip(wire_format.names, zip(*records)):
+        columns[name][target] = values
+    positions[index] = offsets[index] + extractor.current_index
+
+
+def decode_batch(strings: Sequence[str], wire_format: WireFormat) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """Decodes encoded save strings, such as the `extra3` returned by `PokeLoader.encode_story_pokemons`
+
+    Returns one column per named field of `wire_format` (int64, or str for STRING fields),
+    and the number of records of each string.
+    """
+    _check_format(wire_format)
+    buffer, offsets = _translate(strings, _DECODE_TABLE)
+    digits = buffer.astype(np.int64) - ord("0")
+    if digits.size == 0:
+        digits = np.zeros(1, dtype=np.int64)  # Only there so that `take` works, the length check below fails
+
+    lengths, positions = _read(NUMBER, buffer, digits, offsets[:-1])
+    if (lengths != offsets[1:] - offsets[:-1]).any():
+        raise ValueError("The length prefix of some strings does not match their length")
+    counts, positions = _read(NUMBER, buffer, digits, positions)
+
+    rows = np.zeros(len(strings), dtype=np.int64)  # Row of the first record of each string in the columns
+    np.cumsum(counts[:-1], out=rows[1:])
+    total = int(counts.sum())
+    columns = {
+        field.name: np.empty(total, dtype=object if field.kind == STRING else np.int64)
+        for field in wire_format.fields if field.name is not None
+    }
+
+    active = np.arange(len(strings))  # Strings with records left to read
+    record = 0
+    while (active := active[counts[active] > record]).size >= MIN_LOCKSTEP_STRINGS:
+        record_positions = positions[active]
+        for field in wire_format.fields:
+            values, record_positions = _read(field.kind, buffer, digits, record_positions)
+            if field.name is not None:
+                columns[field.name][rows[active] + record] = values
+        positions[active] = record_positions
+        record += 1
+    for string in active.tolist():
+        _read_rest(strings[string], wire_format, columns, positions, offsets, rows, counts, string, record)
+
+    if (positions != offsets[1:]).any():
+        raise ValueError("Some strings do not end after their last record")
+    for field in wire_format.fields:
+        if field.kind == STRING and field.name is not None:
+            columns[field.name] = columns[field.name].astype(str)
+    return columns, counts
+
+
+def _digit_count(values: np.ndarray) -> np.ndarray:
+    "Number of decimal digits of each (non negative) value"
+    return np.maximum(np.searchsorted(_POWERS_OF_TEN, values, side="right"), 1)
+
+
+def _pieces(kind: str, values: np.ndarray) -> list[tuple[np.ndarray, np.ndarray]]:
+    """How a value of `kind` appears on the wire, as (value, number of digits) pairs written one after the other,
+    where value is an array of ints, or of bytes written as-is"""
+    if kind == STRING:
+        strings = np.char.encode(values.astype(str), "ascii")
+        sizes = np.char.str_len(strings).astype(np.int64)
+        return [(sizes, _digit_count(sizes)), (strings, sizes)]
+    values = values.astype(np.int64)
+    if kind == DIGIT:
+        return [(values, _digit_count(values))]
+    limit = 10 ** 10 if kind == NUMBER else 10 ** MAX_DIGITS
+    if values.size and (values.min() < 0 or values.max() >= limit):
+        raise ValueError(f"Values out of range for a {kind}")
+    sizes = _digit_count(values)
+    if kind == NUMBER:
+        return [(sizes, _digit_count(sizes)), (values, sizes)]
+    size_sizes = _digit_count(sizes)
+    return [(size_sizes, _digit_count(size_sizes)), (sizes, size_sizes), (values, sizes)]
+
+
+def _scatter(buffer: np.ndarray, starts: np.ndarray, values: np.ndarray, widths: np.ndarray) -> None:
+    "Writes each value at its start in `buffer`, in decimal if it is an int"
+    if values.dtype.kind == "S":
+        characters = values.view(np.uint8).reshape(len(values), values.itemsize)
+        for offset in range(int(widths.max(initial=0))):
+            writing = widths > offset
+            buffer[starts[writing] + offset] = characters[writing, offset]
+        return
+    for offset in range(int(widths.max(initial=0))):
+        writing = widths > offset
+        powers = _POWERS_OF_TEN[widths[writing] - 1 - offset]
+        buffer[starts[writing] + offset] = values[writing] // powers % 10 + ord("0")
+
+
+def _length_prefix(sizes: np.ndarray) -> list[tuple[np.ndarray, np.ndarray]]:
+    "Same as `DataExtractor.get_length` for data of these sizes, as pieces"
+    digits_len = _digit_count(sizes)
+    final_len = digits_len + sizes + 1
+    while (growing := _digit_count(final_len) > digits_len).any():
+        digits_len = digits_len + growing
+        final_len = final_len + growing
+    signature_len = _digit_count(final_len)
+    return [(signature_len, _digit_count(signature_len)), (final_len, signature_len)]
+
+
+def encode_batch(columns: dict[str, np.ndarray], counts: np.ndarray, wire_format: WireFormat) -> list[str]:
+    """Encodes columns as returned by `decode_batch` back into save strings
+
+    The records of the i-th string are the next `counts[i]` rows of the columns.
+    """
+    _check_format(wire_format)
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    record_pieces = []
+    for field in wire_format.fields:
+        if field.name is None:
+            record_pieces += _pieces(field.kind, np.zeros(total, dtype=np.int64))
+        else:
+            record_pieces += _pieces(field.kind, np.asarray(columns[field.name]))
+
+    # Offset of each record in the body of its string, which starts with the count
+    record_widths = sum(widths for _, widths in record_pieces) if record_pieces else np.zeros(total, dtype=np.int64)
+    record_ends = np.cumsum(record_widths)
+    first_rows = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=first_rows[1:])
+    records_before = np.concatenate(([0], record_ends))[first_rows]  # Width of the records of the previous strings
+    count_pieces = _pieces(NUMBER, counts)
+    count_width = sum(widths for _, widths in count_pieces)
+    body_sizes = count_width + np.concatenate(([0], record_ends))[first_rows + counts] - records_before
+    prefix_pieces = _length_prefix(body_sizes)
+
+    string_sizes = sum(widths for _, widths in prefix_pieces) + body_sizes
+    string_starts = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(string_sizes, out=string_starts[1:])
+    buffer = np.zeros(int(string_starts[-1]), dtype=np.uint8)
+
+    position = string_starts[:-1].copy()
+    for values, widths in prefix_pieces + count_pieces:
+        _scatter(buffer, position, values, widths)
+        position = position + widths
+    string_of_record = np.repeat(np.arange(len(counts)), counts)
+    position = position[string_of_record] + record_ends - record_widths - records_before[string_of_record]
+    for values, widths in record_pieces:
+        _scatter(buffer, position, values, widths)
+        position = position + widths
+
+    joined = _ENCODE_TABLE[buffer].tobytes().decode("ascii")
+    return [joined[start:end] for start, end in zip(string_starts[:-1].tolist(), string_starts[1:].tolist())]
@@ -17,14 +17,50 @@ class DataExtractor:
     def __init__(self, data: str) -> None:
         self.data = decode(data)
         self.current_index = 0
+        self._written: list[str] = []  # Pending writes, joined into `data` once needed
+
+    def _flush(self) -> None:
+        "Appends the pending writes to `data`"
+        if self._written:
+            self.data += "".join(self._written)
+            self._written.clear()
     
+    def read_number(self) -> int:
+        'Reads a single number in the format of (size, actual value)'
+        data = self.data
+        index = self.current_index
+        end = index + 1 + int(data[index])
+        self.current_index = end
+        return int(data[index + 1:end])
+
+    def read_double_number(self) -> int:
+        'Reads a single number in the format of (number of size digits, size, actual value)'
+        data = self.data
+        index = self.current_index
+        start = index + 1 + int(data[index])
+        end = start + int(data[index + 1:start])
+        self.current_index = end
+        return int(data[start:end])
+
+    def read_numbers(self, count: int) -> tuple[int, ...]:
+        'Reads `count` consecutive numbers in the format of (size, actual value)'
+        data = self.data
+        index = self.current_index
+        numbers = []
+        for _ in range(count):
+            end = index + 1 + int(data[index])
+            numbers.append(int(data[index + 1:end]))
+            index = end
+        self.current_index = index
+        return tuple(numbers)
+
     def get_number(self) -> Number:
-        number, self.current_index = Number.from_save(self.data, self.current_index)
-        return number
+        "Same as `read_number`, wrapped in a `Number`"
+        return Number(self.read_number())
 
     def get_double_number(self) -> DoubleNumber:
-        number, self.current_index = DoubleNumber.from_save(self.data, self.current_index)
-        return number
+        "Same as `read_double_number`, wrapped in a `DoubleNumber`"
+        return DoubleNumber(self.read_double_number())
     
     def get_string(self) -> str:
         size = int(self.data[self.current_index])
@@ -32,34 +68,47 @@ class DataExtractor:
         string = self.data[self.current_index : self.current_index + size]
         self.current_index += size
         return string
+
+    def _write(self, string: str, prepend: bool) -> None:
+        if prepend:
+            self._flush()
+            self.data = string + self.data
+        else:
+            self._written.append(string)
     
     def write_digit(self, number: int) -> None:
         'Writes a single digit'
-        self.data += str(number)
+        self._written.append(str(number))
 
     def write_number(self, number: int, prepend: bool = False) -> None:
         'Writes a single number in the format of (size, actual value)'
-        if not isinstance(number, Number):
-            number = Number(number)
+        if isinstance(number, Number):
+            number = number.value
+        assert 0 <= number < (10 ** 10)
+        string = str(number)
         if prepend:
-            self.data + number.to_save() + self.data
+            self._write(str(len(string)) + string, prepend)
         else:
-            self.data += number.to_save()
+            self._written += (str(len(string)), string)
     
     def write_double_number(self, number: int, prepend: bool = False) -> None:
         'Writes a single number in the format of (number of size digits, size, actual value)'
-        if not isinstance(number, DoubleNumber):
-            number = DoubleNumber(number)
+        if isinstance(number, Number):
+            number = number.value
+        assert 0 <= number < (10 ** 100)
+        string = str(number)
+        size = str(len(string))
         if prepend:
-            self.data + number.to_save() + self.data
+            self._write(str(len(size)) + size + string, prepend)
         else:
-            self.data += number.to_save()
+            self._written += (str(len(size)), size, string)
 
     def write_string(self, string: str) -> None:
         'Writes a small string in the format of (length, actual string)'
-        self.data += str(len(string)) + string
+        self._written += (str(len(string)), string)
 
     def get_length(self) -> str:
+        self._flush()
         size = len(self.data)
         digits_len = len(str(size))
         final_len = digits_len + size + 1
@@ -68,3 +117,8 @@ class DataExtractor:
             final_len += 1
         signature_len = len(str(final_len))
         return str(signature_len) + str(final_len)
+
+    def finalize(self) -> str:
+        "Returns the encoded save string of everything written, prefixed by its length"
+        length = self.get_length()
+        return encode(length + self.data)
@@ -1,28 +1,43 @@
-from dataclasses import dataclass
+from src.models.extractor import DataExtractor
+from src.models.wire_format import WireFormat, WireField
+from src.database import Record, slotted_dataclass
 
-from src.models.extractor import DataExtractor, encode
-from src.database import Record
-
-@dataclass
+@slotted_dataclass
 class ExtraInfo(Record):
     info_id: int
     info_value: int
 
+# saveStory -> extra2 and loadStoryProfile -> extra2, one info
+EXTRA_INFO_FORMAT = WireFormat(WireField("info_id"), WireField("info_value"))
+
 class ExtraInfoLoader(DataExtractor):
     "Loads extrainformation from `saveStory` -> `extra2`"
-    def __init__(self, data: str, infos: list[ExtraInfo] = []) -> None:
+    def __init__(self, data: str, infos: list[ExtraInfo]) -> None:
         super().__init__(data)
         self.infos = infos
 
+        self.to_update: list[ExtraInfo] = []  # New infos, and infos whose value changed
+
     def load(self):
-        final_index = self.get_number().value
-        number_of_infos = self.get_number().value
+        "Applies the incoming infos to `infos`, keeping track of which ones changed"
+        saved = {info.info_id: info for info in self.infos}
+        updated = set()  # `id` of the infos in `to_update`
+        final_index = self.read_number()
+        number_of_infos = self.read_number()
+        read_info = EXTRA_INFO_FORMAT.read
         for info_index in range(number_of_infos):
-            info = ExtraInfo(
-                info_id = self.get_number().value,
-                info_value = self.get_number().value,
-            )
-            self.infos.append(info)
+            info_id, info_value = read_info(self)
+            info = saved.get(info_id)
+            if info is None:
+                info = saved[info_id] = ExtraInfo(info_id=info_id, info_value=info_value)
+                updated.add(id(info))
+                self.to_update.append(info)
+            elif info.info_value != info_value:
+                info.info_value = info_value
+                if id(info) not in updated:
+                    updated.add(id(info))
+                    self.to_update.append(info)
+        self.infos[:] = saved.values()
         assert self.current_index == final_index
 
     @classmethod
@@ -30,7 +45,7 @@ class ExtraInfoLoader(DataExtractor):
         "Encode the extra variables for `loadStoryProfile`"
         self = cls('', infos)
         self.write_number(len(infos))
+        write_info = EXTRA_INFO_FORMAT.write
         for info in infos:
-            self.write_number(info.info_id)
-            self.write_number(info.info_value)
-        return encode(self.get_length() + self.data)
+            write_info(self, info)
+        return self.finalize()
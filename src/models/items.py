@@ -1,28 +1,48 @@
-from dataclasses import dataclass
+from src.models.extractor import DataExtractor
+from src.models.wire_format import WireFormat, WireField
+from src.database import Record, slotted_dataclass
 
-from src.models.extractor import DataExtractor, encode
-from src.database import Record
-
-@dataclass
+@slotted_dataclass
 class Item(Record):
     item_id: int
     item_quantity: int
 
+# saveStory -> extra4 and loadStoryProfile -> extra4, one item
+ITEM_FORMAT = WireFormat(WireField("item_id"), WireField("item_quantity"))
+
 class ItemsLoader(DataExtractor):
     "Loads inventory (items) from `saveStory` -> `extra4`"
     def __init__(self, data: str, items: list[Item]) -> None:
         super().__init__(data)
         self.items = items
 
+        self.to_update: list[Item] = []  # New items, and items whose quantity changed
+        self.to_delete: list[Item] = []  # Items whose quantity dropped to zero
+
     def load(self):
-        final_index = self.get_number().value
-        number_of_items = self.get_number().value
+        "Applies the incoming items to `items`, keeping track of which ones changed"
+        saved = {item.item_id: item for item in self.items}
+        updated = set()  # `id` of the items in `to_update`
+        final_index = self.read_number()
+        number_of_items = self.read_number()
+        read_item = ITEM_FORMAT.read
         for info_index in range(number_of_items):
-            item = Item(
-                item_id = self.get_number().value,
-                item_quantity = self.get_number().value,
-            )
-            self.items.append(item)
+            item_id, item_quantity = read_item(self)
+            item = saved.get(item_id)
+            if item_quantity == 0:
+                if item is not None:
+                    self.to_delete.append(item)
+                    del saved[item_id]
+            elif item is None:
+                item = saved[item_id] = Item(item_id=item_id, item_quantity=item_quantity)
+                updated.add(id(item))
+                self.to_update.append(item)
+            elif item.item_quantity != item_quantity:
+                item.item_quantity = item_quantity
+                if id(item) not in updated:
+                    updated.add(id(item))
+                    self.to_update.append(item)
+        self.items[:] = saved.values()
         assert self.current_index == final_index
 
     @classmethod
@@ -30,7 +50,7 @@ class ItemsLoader(DataExtractor):
         "Encode the items for `loadStoryProfile`"
         self = cls('', items)
         self.write_number(len(items))
+        write_item = ITEM_FORMAT.write
         for item in items:
-            self.write_number(item.item_id)
-            self.write_number(item.item_quantity)
-        return encode(self.get_length() + self.data)
+            write_item(self, item)
+        return self.finalize()
@@ -1,10 +1,10 @@
-from dataclasses import dataclass
 from typing import Optional
 
-from src.models.extractor import DataExtractor, encode
-from src.database import Record
+from src.models.extractor import DataExtractor
+from src.models.wire_format import WireFormat, WireField, DOUBLE_NUMBER, STRING
+from src.database import Record, slotted_dataclass
 
-@dataclass
+@slotted_dataclass
 class Pokemon(Record):
     poke_save_id: int
     pokedex_num: int
@@ -25,6 +25,78 @@ class Pokemon(Record):
     poke_nickname: str
 
 
+# saveStory -> extra3, full data of a new pokemon (update field 1)
+SAVE_POKEMON_FORMAT = WireFormat(
+    WireField("pokedex_num"),
+    WireField("poke_exp", DOUBLE_NUMBER),
+    WireField("poke_lvl"),
+    WireField("move_1_id"),
+    WireField("move_2_id"),
+    WireField("move_3_id"),
+    WireField("move_4_id"),
+    WireField("targetting_type"),
+    WireField("poke_gender"),
+    WireField("poke_party_pos"),
+    # elemental, technically also shiny/shadow. Sent as the pokedex number of the variant
+    WireField(
+        "poke_extra",
+        read="0 if {value} == 0 else {value} - {pokedex_num}",
+        write="{pokedex_num} + {value} if {value} else 0",
+    ),
+    WireField("poke_held_item"),
+    WireField("poke_is_hacked_tag", STRING),
+    WireField("poke_selected_move"),
+    WireField("poke_selected_ability"),
+    WireField(None),  # these two unused should always be zero btw
+    WireField(None),
+)
+
+# saveStory -> extra3, fields of an existing pokemon, by update field ID
+# 1 (full data) and 15 (release) are handled by `PokeLoader.load`
+UPDATE_POKEMON_FORMATS = {
+    2: WireFormat(WireField("poke_lvl")),  # Update level
+    3: WireFormat(WireField("poke_exp", DOUBLE_NUMBER)),  # Update Experience
+    4: WireFormat(  # Update moves
+        WireField("move_1_id"), WireField("move_2_id"), WireField("move_3_id"), WireField("move_4_id"),
+    ),
+    5: WireFormat(WireField("poke_held_item")),  # Update held item
+    6: WireFormat(WireField("pokedex_num")),  # Update Evolution (well, pokedex num)
+    7: WireFormat(),  # Update Nickname, sent in `extra` rather than here
+    8: WireFormat(WireField("poke_party_pos")),  # Update Position
+    9: WireFormat(WireField("poke_is_hacked_tag", STRING)),  # Update (hacked) Tag
+    10: WireFormat(WireField("pokedex_num")),  # Update Trade...wut? leaving more or less as-is based on the client *shrug*
+    11: WireFormat(WireField("poke_selected_move")),  # Update selected Move
+    12: WireFormat(WireField("poke_selected_ability")),  # Update selected Ability
+    # Update <UNUSED>. Not sure if this would ever be triggered but whatever
+    13: WireFormat(WireField(None)),
+    14: WireFormat(WireField(None)),
+}
+UPDATE_NICKNAME = 7
+
+# loadStoryProfile -> extra3, one pokemon
+STORY_POKEMON_FORMAT = WireFormat(
+    WireField("pokedex_num"),
+    WireField("poke_exp", DOUBLE_NUMBER),
+    WireField("poke_lvl"),
+    WireField("move_1_id"),
+    WireField("move_2_id"),
+    WireField("move_3_id"),
+    WireField("move_4_id"),
+    WireField("targetting_type"),
+    WireField("poke_gender"),
+    WireField("poke_save_id", DOUBLE_NUMBER),
+    WireField("poke_party_pos"),
+    WireField("poke_extra"),
+    WireField("poke_held_item"),
+    WireField("poke_is_hacked_tag", STRING),
+    WireField(None),  # unused 1
+    WireField("poke_selected_move"),
+    WireField("poke_selected_ability"),
+    WireField(None),  # unused 2
+    WireField(None),  # unused 3
+)
+
+
 class PokeLoader(DataExtractor):
     "Loads pokemons from `saveStory` -> `extra3`"
     def __init__(self, data: str, pokemons: list[Pokemon], *, poke_nicks: Optional[dict] = None) -> None:
@@ -35,6 +107,8 @@ class PokeLoader(DataExtractor):
         self.to_insert: list[Pokemon] = []
         self.to_update: list[Pokemon] = []
         self.to_delete: list[Pokemon] = []
+        self._by_save_id = {poke.poke_save_id: poke for poke in pokemons}
+        self._updated: set[int] = set()  # `id` of the pokemons in `to_update`
 
         if pokemons:
             self._last_id = max(poke.poke_save_id for poke in pokemons) + 1
@@ -42,84 +116,42 @@ class PokeLoader(DataExtractor):
             self._last_id = 1
 
     def load(self):
-        final_index = self.get_number().value
-        number_of_pokes = self.get_number().value
+        final_index = self.read_number()
+        number_of_pokes = self.read_number()
         for poke_index in range(1, number_of_pokes+1):
-            number_of_fields = self.get_number().value
-            poke_save_id = self.get_double_number().value
+            number_of_fields = self.read_number()
+            poke_save_id = self.read_double_number()
 
             if poke_save_id == 0:  # New pokemon
                 poke = None
                 poke_save_id = self._last_id
                 self._last_id += 1
             else:  # Update or delete (release) existing pokemon
-                poke = next(pk for pk in self.pokemons if pk.poke_save_id == poke_save_id)
+                poke = self._by_save_id[poke_save_id]
 
             for field in range(number_of_fields):
-                field_id = self.get_number().value
+                field_id = self.read_number()
                 if field_id == 1: # New pokemon - Full data
                     assert poke is None
-                    poke = Pokemon(
-                        poke_save_id = poke_save_id,
-                        pokedex_num = (pokedex := self.get_number().value),
-                        poke_exp = self.get_double_number().value,
-                        poke_lvl = self.get_number().value,
-                        move_1_id = self.get_number().value,
-                        move_2_id = self.get_number().value,
-                        move_3_id = self.get_number().value,
-                        move_4_id = self.get_number().value,
-                        targetting_type = self.get_number().value,
-                        poke_gender = self.get_number().value,
-                        poke_party_pos = self.get_number().value,
-                        poke_extra = 0 if (element := self.get_number().value) == 0 else (element - pokedex),  # elemental, technically also shiny/shadow
-                        poke_held_item = self.get_number().value,
-                        poke_is_hacked_tag = self.get_string(),
-                        poke_selected_move = self.get_number().value,
-                        poke_selected_ability = self.get_number().value,
-                        poke_nickname=self.poke_nicks.get(poke_index),
+                    poke = SAVE_POKEMON_FORMAT.load(
+                        self, Pokemon, poke_save_id=poke_save_id, poke_nickname=self.poke_nicks.get(poke_index),
                     )
-                    unused_1 = self.get_number()  # must leave here for the current_index offset
-                    unused_2 = self.get_number()  # these two unused should always be zero btw
                     self.to_insert.append(poke)
                 elif field_id == 15:  # Release - Must Delete
                     assert poke is not None
                     self.to_delete.append(poke)
                 else: # To update
                     assert poke is not None
-                    if poke not in self.to_update:
+                    update_format = UPDATE_POKEMON_FORMATS.get(field_id)
+                    if update_format is None:
+                        raise Exception("Unexpected Poke Update Field ID", field_id)
+                    if id(poke) not in self._updated:
+                        self._updated.add(id(poke))
                         self.to_update.append(poke)
 
-                    if field_id == 3:  # Update Experience
-                        poke.poke_exp = self.get_double_number().value
-                    elif field_id == 2:  # Update level
-                        poke.poke_lvl = self.get_number().value
-                    elif field_id == 4:  # Update moves
-                        poke.move_1_id = self.get_number().value
-                        poke.move_2_id = self.get_number().value
-                        poke.move_3_id = self.get_number().value
-                        poke.move_4_id = self.get_number().value
-                    elif field_id == 5:  # Update held item
-                        poke.poke_held_item = self.get_number().value
-                    elif field_id == 6:  # Update Evolution (well, pokedex num)
-                        poke.pokedex_num = self.get_number().value
-                    elif field_id == 10:  # Update Trade...wut? leaving more or less as-is based on the client *shrug*
-                        poke.pokedex_num = self.get_number().value
-                    elif field_id == 7:  # Update Nickname
+                    update_format.update(self, poke)
+                    if field_id == UPDATE_NICKNAME:
                         poke.poke_nickname = self.poke_nicks[poke_index]
-                    elif field_id == 8:  # Update Position
-                        poke.poke_party_pos = self.get_number().value
-                    elif field_id == 9:  # Update (hacked) Tag
-                        poke.poke_is_hacked_tag = self.get_string()
-                    elif field_id == 11:  # Update selected Move
-                        poke.poke_selected_move = self.get_number().value
-                    elif field_id == 12:  # Update selected Ability
-                        poke.poke_selected_ability = self.get_number().value
-                    elif field_id == 13:  # Update <UNUSED>. Not sure if this would ever be triggered but whatever
-                        unused_1 = self.get_number()
-                    elif field_id == 14:  # Update <UNUSED>. Not sure if this would ever be triggered but whatever
-                        unused_2 = self.get_number()
-                    else:
-                        raise Exception("Unexpected Poke Update Field ID", field_id)
         assert self.current_index == final_index
 
     @classmethod
@@ -128,35 +160,8 @@ class PokeLoader(DataExtractor):
         pokemons.sort(key=lambda poke: poke.poke_party_pos)
         self = cls('', pokemons)
         self.write_number(len(pokemons))
+        write_pokemon = STORY_POKEMON_FORMAT.write
         for i, pokemon in enumerate(pokemons, 1):
             url_parameters[f"PN{i}"] = pokemon.poke_nickname
-            self.write_number(pokemon.pokedex_num)
-
-            self.write_double_number(pokemon.poke_exp)
-            self.write_number(pokemon.poke_lvl)
-
-            self.write_number(pokemon.move_1_id)
-            self.write_number(pokemon.move_2_id)
-            self.write_number(pokemon.move_3_id)
-            self.write_number(pokemon.move_4_id)
-
-            self.write_number(pokemon.targetting_type)
-            self.write_number(pokemon.poke_gender)
-            
-            self.write_double_number(pokemon.poke_save_id)
-            
-            self.write_number(pokemon.poke_party_pos)
-            self.write_number(pokemon.poke_extra)
-            self.write_number(pokemon.poke_held_item)
-
-            self.write_string(pokemon.poke_is_hacked_tag)
-            
-            self.write_number(0)  # unused 1
-            
-            self.write_number(pokemon.poke_selected_move)
-            self.write_number(pokemon.poke_selected_ability)
-
-            self.write_number(0)  # unused 2
-            self.write_number(0)  # unused 3
-
-        return encode(self.get_length() + self.data)
+            write_pokemon(self, pokemon)
+        return self.finalize()
@@ -1,10 +1,10 @@
-from dataclasses import dataclass
 from typing import Optional
 
-from src.database.record import Record
-from src.models.extractor import DataExtractor, decode, encode
+from src.database.record import Record, slotted_dataclass
+from src.models.extractor import DataExtractor, decode
+from src.models.wire_format import WireFormat, WireField, DIGIT, STRING
 
-@dataclass
+@slotted_dataclass
 class Profile(Record):
     # email: str
     # password: str
@@ -22,6 +22,21 @@ class Profile(Record):
         return cls(1, 'Red', 2, 0, 10, 1, 1)
 
 
+# loadStory -> extra, one profile
+PROFILE_FORMAT = WireFormat(
+    WireField("profile_id", DIGIT),
+    WireField("money", STRING, read="int({value})", write="str({value})"),
+    WireField("max_level_complete", STRING, read="int({value})", write="str({value})"),
+    WireField("max_level_accomplished", STRING, read="int({value})", write="str({value})"),
+)
+
+# loadStoryProfile -> extra
+STORY_PROFILE_FORMAT = WireFormat(
+    WireField("max_level_complete", write="int({value})"),
+    WireField("max_level_accomplished", write="int({value})"),
+)
+
+
 class ProfileLoader(DataExtractor):
     "Loads Story Profiles"
     def __init__(self, data: str, profiles: list[Profile]) -> None:
@@ -55,19 +70,15 @@ class ProfileLoader(DataExtractor):
         self = cls('', profiles)
         self.write_digit(len(profiles))
         for profile in profiles:
-            self.write_digit(profile.profile_id)
-            self.write_string(str(profile.money))
-            self.write_string(str(profile.max_level_complete))
-            self.write_string(str(profile.max_level_accomplished))
+            PROFILE_FORMAT.write(self, profile)
             url_parameters[f'Nickname{profile.profile_id}'] = profile.profile_nickname
             url_parameters[f'Version{profile.profile_id}'] = profile.game_version
 
-        return encode(self.get_length() + self.data)
+        return self.finalize()
 
     @classmethod
     def encode_story_profile(cls, profile: Profile, url_parameters: dict) -> str:
         "Encode one profile for `loadStoryProfile`"
         self = cls('', [profile])
-        self.write_number(int(profile.max_level_complete))
-        self.write_number(int(profile.max_level_accomplished))
-        return encode(self.get_length() + self.data)
+        STORY_PROFILE_FORMAT.write(self, profile)
+        return self.finalize()
@@ -0,0 +1,135 @@
+"""Layouts of the records in the save strings (`extra`, `extra2`, `extra3` and `extra4`)
+
+A `WireFormat` lists the fields of a record in the order they appear on the wire, and generates the functions
+reading and writing that record straight from/to a `DataExtractor`, without going field by field through its methods.
+The same description is used in both directions, so encoding and decoding cannot drift apart.
+"""
+
+from typing import Callable, NamedTuple, Optional
+
+from src.models.extractor import DataExtractor
+
+DIGIT = "digit"  # A single digit
+NUMBER = "number"  # (size, actual value)
+DOUBLE_NUMBER = "double_number"  # (number of size digits, size, actual value)
+STRING = "string"  # (length, actual string)
+
+
+class WireField(NamedTuple):
+    """One value of a record on the wire.
+
+    `name` is the record attribute, or None for unused slots, read and dropped, and written as `0`.
+    `read` and `write` are expressions converting the value, in which `{value}` is the value on the wire
+    and `{attribute}` the value of another field (already read when reading).
+    """
+    name: Optional[str]
+    kind: str = NUMBER
+    read: Optional[str] = None
+    write: Optional[str] = None
+
+
+def _read_statements(kind: str, variable: str) -> list[str]:
+    "Statements reading a value at `index` in `data` into `variable`, and moving `index` past it"
+    if kind == DIGIT:
+        return [f"{variable} = int(data[index])", "index += 1"]
+    elif kind == NUMBER:
+        return ["end = index + 1 + int(data[index])", f"{variable} = int(data[index + 1:end])", "index = end"]
+    elif kind == DOUBLE_NUMBER:
+        return [
+            "start = index + 1 + int(data[index])",
+            "end = start + int(data[index + 1:start])",
+            f"{variable} = int(data[start:end])",
+            "index = end",
+        ]
+    elif kind == STRING:
+        return ["end = index + 1 + int(data[index])", f"{variable} = data[index + 1:end]", "index = end"]
+    raise ValueError(f"Unknown wire field kind {kind!r}")
+
+
+def _write_statements(kind: str, expression: str, variable: str) -> tuple[list[str], list[str]]:
+    "Statements converting `expression` to strings, and the strings to write"
+    if kind == DIGIT:
+        return [f"{variable} = str({expression})"], [variable]
+    elif kind == NUMBER:
+        return [
+            f"{variable} = {expression}",
+            f"assert 0 <= {variable} < 10 ** 10",
+            f"{variable} = str({variable})",
+        ], [f"str(len({variable}))", variable]
+    elif kind == DOUBLE_NUMBER:
+        return [
+            f"{variable} = {expression}",
+            f"assert 0 <= {variable} < 10 ** 100",
+            f"{variable} = str({variable})",
+            f"{variable}_size = str(len({variable}))",
+        ], [f"str(len({variable}_size))", f"{variable}_size", variable]
+    elif kind == STRING:
+        return [f"{variable} = {expression}"], [f"str(len({variable}))", variable]
+    raise ValueError(f"Unknown wire field kind {kind!r}")
+
+
+class WireFormat:
+    """Layout of a record on the wire, compiled into:
+
+    - `read(extractor)`: Reads the record at the cursor, returning the values of the named fields in order
+    - `load(extractor, cls, **known)`: Same, but returns `cls(**values, **known)`
+    - `update(extractor, record)`: Same, but sets the values on `record`
+    - `write(extractor, record)`: Writes the record
+    """
+
+    def __init__(self, *fields: WireField):
+        self.fields = fields
+        self.names = tuple(field.name for field in fields if field.name is not None)
+        variables = {field.name: f"v{index}" for index, field in enumerate(fields) if field.name is not None}
+
+        reads = ["data = extractor.data", "index = extractor.current_index"]
+        for index, field in enumerate(fields):
+            variable = variables.get(field.name, f"unused{index}")
+            reads += _read_statements(field.kind, variable)
+            if field.read is not None:
+                reads.append(f"{variable} = {field.read.format(value=variable, **variables)}")
+        reads.append("extractor.current_index = index")
+        values = [variables[name] for name in self.names]
+
+        writes, written = [], []
+        attributes = {name: f"record.{name}" for name in self.names}
+        for index, field in enumerate(fields):
+            if field.name is None:
+                expression = "0"
+            elif field.write is not None:
+                expression = field.write.format(value=attributes[field.name], **attributes)
+            else:
+                expression = attributes[field.name]
+            statements, strings = _write_statements(field.kind, expression, f"w{index}")
+            writes += statements
+            written += strings
+
+        def block(statements: list[str]) -> str:
+            return "".join(f"    {statement}\n" for statement in statements)
+
+        source = (
+            f"def read(extractor):\n"
+            f"{block(reads)}"
+            f"    return ({''.join(f'{value}, ' for value in values)})\n"
+            f"\n"
+            f"def load(extractor, cls, /, **known):\n"
+            f"{block(reads)}"
+            f"    return cls({''.join(f'{name}={variables[name]}, ' for name in self.names)}**known)\n"
+            f"\n"
+            f"def update(extractor, record):\n"
+            f"{block(reads)}"
+            f"{block([f'record.{name} = {variables[name]}' for name in self.names])}"
+            f"\n"
+            f"def write(extractor, record):\n"
+            f"{block(writes)}"
+            f"    extractor._written += ({''.join(f'{string}, ' for string in written)})\n"
+        )
+        namespace = {}
+        exec(source, namespace)
+        self.read: Callable[[DataExtractor], tuple] = namespace["read"]
+        self.load: Callable[..., object] = namespace["load"]
+        self.update: Callable[[DataExtractor, object], None] = namespace["update"]
+        self.write: Callable[[DataExtractor, object], None] = namespace["write"]
+
+    def __repr__(self) -> str:
+        return f"WireFormat{self.fields}"
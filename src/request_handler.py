@@ -5,8 +5,10 @@ from werkzeug.datastructures import ImmutableMultiDict
 from src.models.networking import Request, Response
 from src.models.extractor import encode
 from src.manage_save import (
+    get_profile_key,
     get_profiles_list,
     get_story_profile,
+    story_profile_cache,
     set_save_data,
     delete_save_data,
 )
@@ -34,9 +36,15 @@ def handle_request(data: ImmutableMultiDict[str, str]):
     elif action == 'loadStory':  # From: screen.popup_StoryLoad
         return Response(Result='Success', **get_profiles_list(data))
     elif action == 'loadStoryProfile':  # From: screen.popup_Story_Profile_Load
-        profile_data = get_story_profile(data)
-        _check_sum = encode(str(create_check_sum(profile_data['extra3'] + CS)))
-        return Response(Result='Success', **profile_data, CS=CS, extra5=_check_sum)
+        profile_key = get_profile_key(data)
+        response = story_profile_cache.get(profile_key)
+        if response is None:
+            version = story_profile_cache.version(profile_key)
+            profile_data = get_story_profile(data)
+            _check_sum = encode(str(create_check_sum(profile_data['extra3'] + CS)))
+            response = Response(Result='Success', **profile_data, CS=CS, extra5=_check_sum)
+            story_profile_cache.set(profile_key, response, version)
+        return response
     elif action == 'saveStory':  # From: scren.popup_Story_Save
         return Response(Result='Success', CS=CS, **set_save_data(data))
     elif action == 'deleteStory':  # From: scren.popup_Story_Delete
@@ -1,5 +1,26 @@
 import os
 
+import pytest
+
 os.environ["DETA_ORM_DATABASE_MODE"] = "MEMORY"
 os.environ["DETA_ORM_FORMAT_NICELY"] = "1"
-os.environ["DETA_PROJECT_KEY"] = ""
\ No newline at end of file
+os.environ["DETA_PROJECT_KEY"] = ""
+
+@pytest.fixture
+def make_box():
+    "Builds boxes of `size` pokemons with save IDs 1..size, which vary with `seed`"
+    from src.models.pokemon import Pokemon
+
+    def make_box(size: int, seed: int = 0) -> list[Pokemon]:
+        return [
+            Pokemon(
+                poke_save_id=save_id, pokedex_num=(save_id * 37 + seed) % 649 + 1,
+                poke_exp=(save_id * 7919 + seed) ** 2, poke_lvl=save_id % 100 + 1,
+                move_1_id=save_id, move_2_id=0, move_3_id=seed, move_4_id=save_id * seed,
+                targetting_type=1, poke_gender=save_id % 3, poke_party_pos=save_id - 1, poke_extra=seed % 3,
+                poke_held_item=0, poke_is_hacked_tag='h' if save_id % 5 == 0 else 'n',
+                poke_selected_move=1, poke_selected_ability=0, poke_nickname=f"Poke{save_id}",
+            )
+            for save_id in range(1, size + 1)
+        ]
+    return make_box
@@ -47,3 +47,49 @@ def test_encode(first_party):
     assert url_params['PN1'] == 'Pichu'
     assert url_params['PN2'] == 'Rattata'
     assert data == 'woqywcyrwycywyyrwwwcqapycymyyyyyyyymymymynymycymymymwyoywqwypyyycyqymyyyyyywyyymymynymycymymym'
+
+def test_wire_formats(first_party, second_party):
+    "Pokemons written with a wire format are read back identically"
+    import dataclasses
+    from src.models.extractor import DataExtractor
+    from src.models.pokemon import SAVE_POKEMON_FORMAT, STORY_POKEMON_FORMAT, UPDATE_POKEMON_FORMATS
+    pokemons = [*first_party.values(), *second_party.values()]
+    for wire_format in (SAVE_POKEMON_FORMAT, STORY_POKEMON_FORMAT):
+        writer = DataExtractor('')
+        for poke in pokemons:
+            wire_format.write(writer, poke)
+        reader = DataExtractor(writer.finalize())
+        reader.read_number()  # Length
+        known = {name: None for name in ('poke_save_id', 'poke_nickname') if name not in wire_format.names}
+        loaded = [wire_format.load(reader, Pokemon, **known) for _ in pokemons]
+        assert reader.current_index == len(reader.data)
+        assert [poke.to_dict() for poke in loaded] == [{**poke.to_dict(), **known} for poke in pokemons]
+    writer = DataExtractor('')
+    UPDATE_POKEMON_FORMATS[4].write(writer, first_party['rattata'])
+    reader = DataExtractor(writer.finalize())
+    reader.read_number()  # Length
+    poke = dataclasses.replace(first_party['pichu'])
+    UPDATE_POKEMON_FORMATS[4].update(reader, poke)
+    assert (poke.move_1_id, poke.move_2_id, poke.pokedex_num) == (1, 3, 172)
+
+def test_update_by_save_id(first_party):
+    "Existing pokemons are found by save ID, and only listed once in `to_update`"
+    import dataclasses
+    from src.models.extractor import DataExtractor
+    from src.models.pokemon import UPDATE_POKEMON_FORMATS
+    pokemons = [dataclasses.replace(poke) for poke in first_party.values()]
+    writer = DataExtractor('')
+    writer.write_number(3)
+    for poke, field_id, changes in (
+        (pokemons[1], 2, {'poke_lvl': 9}),
+        (pokemons[0], 8, {'poke_party_pos': 1}),
+        (pokemons[1], 3, {'poke_exp': 99}),
+    ):
+        writer.write_number(1)
+        writer.write_double_number(poke.poke_save_id)
+        writer.write_number(field_id)
+        UPDATE_POKEMON_FORMATS[field_id].write(writer, dataclasses.replace(poke, **changes))
+    loader = PokeLoader(data=writer.finalize(), pokemons=pokemons)
+    loader.load()
+    assert loader.to_update == [pokemons[1], pokemons[0]]
+    assert (pokemons[1].poke_lvl, pokemons[1].poke_exp, pokemons[0].poke_party_pos) == (9, 99, 1)
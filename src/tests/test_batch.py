@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.models import batch
+from src.models.extractor import decode, encode
+from src.models.items import Item, ItemsLoader, ITEM_FORMAT
+from src.models.pokemon import PokeLoader, STORY_POKEMON_FORMAT
+
+def test_translate():
+    strings = ["0123456789", "", "abc0"]
+    assert batch.translate(strings, decoding=False) == [encode(string) for string in strings]
+    assert batch.translate([encode(string) for string in strings], decoding=True) == [decode(encode(string)) for string in strings]
+
+def test_pokemons_round_trip(make_box, monkeypatch):
+    boxes = [make_box(size, seed) for seed, size in enumerate((3, 0, 1, 25, 12))]
+    strings = [PokeLoader.encode_story_pokemons(box, {}) for box in boxes]
+    pokemons = [poke for box in boxes for poke in box]
+    for min_lockstep_strings in (1, 3, 10):  # Lockstep only, then switching to one by one after some records, and never
+        monkeypatch.setattr(batch, "MIN_LOCKSTEP_STRINGS", min_lockstep_strings)
+        columns, counts = batch.decode_batch(strings, STORY_POKEMON_FORMAT)
+        assert counts.tolist() == [len(box) for box in boxes]
+        for name in STORY_POKEMON_FORMAT.names:
+            assert columns[name].tolist() == [getattr(poke, name) for poke in pokemons], name
+        assert batch.encode_batch(columns, counts, STORY_POKEMON_FORMAT) == strings
+
+def test_items_round_trip():
+    inventories = [[Item(1, 5), Item(20, 123456)], [], [Item(3, 1)]]
+    strings = [ItemsLoader.encode_story_items(items, {}) for items in inventories]
+    columns, counts = batch.decode_batch(strings, ITEM_FORMAT)
+    assert columns["item_quantity"].tolist() == [5, 123456, 1]
+    assert batch.encode_batch(columns, counts, ITEM_FORMAT) == strings
+
+def test_invalid_strings():
+    string = ItemsLoader.encode_story_items([Item(1, 5)], {})
+    with pytest.raises(ValueError):
+        batch.decode_batch([string + encode("0")], ITEM_FORMAT)
+    with pytest.raises(ValueError):
+        batch.decode_batch([string[:-1]], ITEM_FORMAT)
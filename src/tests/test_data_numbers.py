@@ -18,3 +18,14 @@ def test_data_numbers():
     assert current_index == len(string)
 
     assert (n_1.to_save() + n_2.to_save() + n_3.to_save() + n_4.to_save()) == string
+
+def test_extractor_readers():
+    from src.models.extractor import DataExtractor, encode
+    extractor = DataExtractor(encode("1521121512345123451234511"))
+    assert extractor.read_number() == 5
+    assert extractor.read_numbers(1) == (11,)
+    assert extractor.read_double_number() == 123451234512345
+    assert extractor.get_number().value == 1
+    assert extractor.current_index == len(extractor.data)
+    extractor.current_index = 0
+    assert extractor.read_numbers(2) == (5, 11)
@@ -27,3 +27,351 @@ def test_typeless():
     assert copy.name == 'bob', copy._ignore == 1
     del db_typeless['record']
     assert db_typeless.get('record') is None
+
+def test_disk_journal(tmp_path, monkeypatch):
+    from src.database._local_base import DiskBaseBackend
+    monkeypatch.setenv("DETA_ORM_FOLDER", str(tmp_path))
+    monkeypatch.setenv("DETA_ORM_JOURNAL_LIMIT", "0")  # Compact on every write
+
+    backend = DiskBaseBackend("journal_db.json")
+    backend['a'] = '1'
+    backend.update({'b': '2', 'c': '3'})
+    del backend['a']
+    backend.compact()
+    backend['d'] = '4'
+    backend.compact()
+
+    reloaded = DiskBaseBackend("journal_db.json")
+    assert reloaded == {'b': '2', 'c': '3', 'd': '4'}
+    assert (tmp_path / "journal_db.json").exists()
+
+    monkeypatch.setenv("DETA_ORM_JOURNAL_LIMIT", str(1024 * 1024))
+    appended = DiskBaseBackend("journal_db.json")
+    appended.pop('b')
+    assert not (tmp_path / "journal_db.journal.old").exists()
+    assert DiskBaseBackend("journal_db.json") == {'c': '3', 'd': '4'}
+
+def test_interrupted_compaction(tmp_path, monkeypatch):
+    import pytest
+    from src.database._local_base import DiskBaseBackend
+    monkeypatch.setenv("DETA_ORM_FOLDER", str(tmp_path))
+    backend = DiskBaseBackend("crash_db.json")
+    backend['x'] = [backend.add_schema(['a']), 1]
+    backend['y'] = [backend.add_schema(['b', 'c']), 2, 3]
+    # The process dies after writing the snapshot, before removing the compacted journal
+    with monkeypatch.context() as patch:
+        patch.setattr(DiskBaseBackend, "_compact", lambda self, snapshot: self._write_snapshot(*snapshot))
+        backend.compact()
+    assert (tmp_path / "crash_db.journal.old").exists()
+
+    reloaded = DiskBaseBackend("crash_db.json")
+    assert reloaded.schemas == [('a',), ('b', 'c')]
+    assert reloaded == {'x': [0, 1], 'y': [1, 2, 3]}
+    assert not (tmp_path / "crash_db.journal.old").exists()
+
+    with (tmp_path / "crash_db.journal").open('a') as journal:
+        journal.write('["schema",1,["d"]]\n')
+    with pytest.raises(ValueError):
+        DiskBaseBackend("crash_db.json")
+
+def test_shared_disk_backend(tmp_path, monkeypatch):
+    from src.database._local_base import Base, DiskBaseBackend
+    monkeypatch.setenv("DETA_ORM_FOLDER", str(tmp_path))
+    first = Base("shared_db", sync_disk=True)
+    second = Base("shared_db", sync_disk=True)
+    assert first.inventory is second.inventory
+
+    first.put({"name": "bob"}, "bob")
+    first.inventory.compact()
+    second.put({"name": "alice"}, "alice")  # Written after the compaction rotated the journal
+    first.inventory.compact()
+    second.put({"name": "carol"}, "carol")
+
+    assert sorted(DiskBaseBackend("shared_db.json")) == ["alice", "bob", "carol"]
+    rows = Base("shared_db", sync_disk=True, storage_format="ROWS")  # Converts the values for every base
+    assert first.get("carol") == rows.get("carol") == {"name": "carol", "key": "carol"}
+
+def test_prefix_fetch():
+    from src.database import Query, Field
+    db = Database("test_prefix_db", Foo)
+    db.put_many({f"user{i}$1": Foo(f'user{i}', i, str(i)) for i in range(12)})
+    del db["user1$1"]
+
+    fetched = db.fetch(Query(Field("key").startswith("user1")))
+    assert [foo.age for foo in fetched] == [10, 11]
+    fetched = db.fetch(Query(Field("key").startswith("user1")) | Query(Field("key") == "user2$1"))
+    assert [foo.age for foo in fetched] == [10, 11, 2]
+    fetched = db.fetch(Query(Field("key").startswith("user1"), Field("age") > 10))
+    assert [foo.age for foo in fetched] == [11]
+
+def test_indexed_fetch():
+    from src.database import Query, Field
+    db = Database("test_indexed_db", Foo, indexes=["name", "age"])
+    db.put_many({str(i): Foo('bob' if i % 2 else 'alice', i, str(i)) for i in range(20)})
+    db.update("3", {"name": "alice"})
+    del db["5"]
+
+    assert [foo.age for foo in db.fetch(Query(Field("name") == "bob", Field("age") < 8))] == [1, 7]
+    assert [foo.age for foo in db.fetch(Query(Field("age").in_range(16, 18)))] == [16, 17, 18]
+    assert [foo.age for foo in db.fetch(Query(Field("age") >= 18) | Query(Field("name") == "alice", Field("age") <= 3))] == [0, 18, 19, 2, 3]
+
+def test_compiled_queries():
+    from src.database import Query, Field
+    from src.database._local_query import compile_query, _compile_shape
+    db = Database("test_compiled_db")
+    db.put_many({
+        "1": {"person": {"name": "bob", "age": 12}, "hobbies": ["gaming"]},
+        "2": {"person": {"name": "alice", "age": 30}, "hobbies": ["reading", "gaming"]},
+        "3": {"hobbies": []},
+    })
+    assert [r["person"]["age"] for r in db.fetch(Query(Field("person.name") == "bob"))] == [12]
+    assert [r["key"] for r in db.fetch(Query(Field("person.age") > 18) | Query(Field("hobbies") == ["gaming"]))] == ["1", "2"]
+    assert [r["key"] for r in db.fetch(Query(Field("hobbies").contains("gaming"), Field("person.age").in_range(0, 20)))] == ["1"]
+
+    _compile_shape.cache_clear()
+    for name in ("bob", "alice", "carol"):
+        predicate = compile_query(Query(Field("person.name") == name, Field("key").startswith("1")).to_list())
+        assert predicate({"key": "1", "person": {"name": "bob"}}) == (name == "bob")
+    assert _compile_shape.cache_info().misses == 1
+
+def test_paginated_fetch():
+    from src.database import Query, Field
+    db = Database("test_paginated_db", Foo, indexes=["age"])
+    db.put_many({f"{i:02}": Foo('bob', i, str(i)) for i in range(30)})
+
+    assert [foo.age for foo in db.fetch(limit=5)] == [0, 1, 2, 3, 4]
+    assert [foo.age for foo in db.fetch(limit=5, last="04")] == [5, 6, 7, 8, 9]
+    assert [foo.age for foo in db.fetch(Query(Field("age") > 20), limit=3, last="22")] == [23, 24, 25]
+    assert len(db.fetch(Query(Field("name") == "bob"), limit=25, follow_last=True)) == 25
+    assert [foo.age for foo in db.iter_fetch(Query(Field("key").startswith("1")), page_size=4)] == list(range(10, 20))
+
+    base = db._Database__base
+    assert base.fetch(None, 5, "20").last == "25"
+    assert base.fetch(None, 5, "24").last is None  # Nothing left after the page
+    assert base.fetch({"age?lt": 5}, 5, None).last is None
+    keys = base.inventory.key_index
+    assert list(keys.iter_from("27")) == ["28", "29"] and list(keys.iter_from()) == sorted(base.inventory)
+
+def test_storage_isolation(tmp_path, monkeypatch):
+    import json
+    db = Database("test_isolation_db")
+    db["record"] = {"hobbies": ["gaming"]}
+    db["record"]["hobbies"].append("reading")
+    assert db["record"]["hobbies"] == ["gaming"]
+
+    monkeypatch.setenv("DETA_ORM_FOLDER", str(tmp_path))
+    monkeypatch.setenv("DETA_ORM_DATABASE_MODE", "DISK")
+    (tmp_path / "test_legacy_db.json").write_text(json.dumps({"record": json.dumps({"name": "bob"})}))
+    assert Database("test_legacy_db")["record"]["name"] == "bob"
+
+def test_expiration():
+    from datetime import datetime, timedelta
+    db = Database("test_expiration_db", Foo, indexes=["name"])
+    db.put("expired", Foo('bob', 1, '1'), expire_in=0)
+    db.put("expired_at", Foo('bob', 2, '2'), expire_at=datetime.now() - timedelta(seconds=5))
+    db.put("kept", Foo('bob', 3, '3'), expire_in=60)
+    db.put("overwritten", Foo('bob', 4, '4'), expire_in=0)
+    db.put("overwritten", Foo('bob', 4, '4'))
+
+    assert db.get("expired") is None
+    assert [foo.age for foo in db.fetch()] == [3, 4]
+    assert [foo.age for foo in db.fetch({"name": "bob"})] == [3, 4]
+
+def test_put_many_chunks(monkeypatch):
+    import pytest
+    from src.database.exceptions import PutManyError
+    db = Database("test_chunks_db", Foo)
+    db.put_many([Foo('bob', i, str(i)) for i in range(100)], key_source="id", iter=True, concurrency=4)
+    assert len(db.fetch()) == 100
+
+    base = db._Database__base
+    put_many = base.put_many
+    def failing_put_many(items, **kwargs):
+        if any(item["key"] == "60" for item in items):
+            raise ValueError("Failed")
+        put_many(items, **kwargs)
+    monkeypatch.setattr(base, "put_many", failing_put_many)
+
+    with pytest.raises(PutManyError) as error:
+        db.put_many({str(i): Foo('alice', i, str(i)) for i in range(100)}, iter=True, concurrency=4)
+    assert list(error.value.failures) == [2]
+    assert "60" in error.value.chunk_keys[2]
+    assert len(db.fetch({"name": "alice"})) == 75
+
+def test_async_database():
+    import asyncio
+    from src.database import AsyncDatabase, Query, Field
+
+    async def run():
+        db = AsyncDatabase("test_async_db", Foo)
+        await db.put("bob", Foo('bob', 20, '1'))
+        await db.put_many([Foo('alice', i, str(i)) for i in range(60)], key_source=lambda foo: f"alice{foo.age:02}", iter=True)
+        await db.update("bob", {"age": 21})
+        await db.delete("alice00")
+        assert (await db.get("bob")).age == 21
+        fetched = await db.fetch(Query(Field("key").startswith("alice")), limit=30, follow_last=True)
+        assert [foo.age for foo in fetched] == list(range(1, 31))
+        assert len([foo async for foo in db.iter_fetch(page_size=7)]) == 60
+        db._is_local = False  # Deleting key by key, as with Deta Base
+        await db.delete_prefix("alice1")
+        assert sorted([key async for key in db.iter_keys(page_size=7)])[:3] == ["alice01", "alice02", "alice03"]
+        assert len(await db.fetch(Query(Field("key").startswith("alice")), follow_last=True)) == 49
+        await db.close()
+
+    asyncio.run(run())
+
+def test_async_disk_database(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+    from src.database import AsyncDatabase
+    from src.database._local_base import DiskBaseBackend
+    monkeypatch.setenv("DETA_ORM_FOLDER", str(tmp_path))
+    monkeypatch.setenv("DETA_ORM_DATABASE_MODE", "DISK")
+    threads = set()
+    monkeypatch.setattr(DiskBaseBackend, "_sync", lambda self, method, value, *args, **kwargs: threads.add(threading.current_thread()))
+
+    async def run():
+        db = AsyncDatabase("test_async_disk_db", Foo)
+        await db.put("bob", Foo('bob', 20, '1'))  # Writes to the journal outside of the event loop
+        assert threads and threading.current_thread() not in threads
+        assert (await db.get("bob")).age == 20
+
+    asyncio.run(run())
+
+def test_bulk_delete(tmp_path, monkeypatch):
+    from src.database import Query, Field
+    from src.database._local_base import DiskBaseBackend
+    db = Database("test_bulk_delete_db", Foo)
+    db.put_many([Foo('bob', i, f"bob${i}") for i in range(30)], key_source="id", iter=True)
+    db.put_many([Foo('bobby', i, f"bobby${i}") for i in range(5)], key_source="id")
+    db.delete_many(["bob$0", "bob$1", "missing"])
+    assert len(db.fetch(Query(Field("key").startswith("bob$")))) == 28
+    db.delete_prefix("bob$")
+    assert db.fetch(Query(Field("key").startswith("bob$"))) == []
+    assert len(db.fetch({"name": "bobby"})) == 5
+
+    monkeypatch.setenv("DETA_ORM_FOLDER", str(tmp_path))
+    backend = DiskBaseBackend("bulk_delete_db.json")
+    backend.update({'a$1': 1, 'a$2': 2, 'b$1': 3})
+    assert backend.delete_prefix('a$') == ['a$1', 'a$2']
+    assert DiskBaseBackend("bulk_delete_db.json") == {'b$1': 3}
+
+def test_record_cache():
+    from src.database import Query, Field, RecordCache
+    db = Database("test_cache_db", Foo, cache=RecordCache(max_size=10_000, ttl=0))
+    db.put("bob", Foo('bob', 20, '1'))
+    db.put_many([Foo('alice', i, str(i)) for i in range(5)], key_source=lambda foo: f"alice${foo.age}")
+
+    bob = db.get("bob")
+    bob.age = 99  # Callers modifying records do not change the cache
+    assert db.get("bob").age == 20
+    assert db.cache.hits == 2 and db.cache.misses == 0
+
+    assert len(db.fetch(Query(Field("key").startswith("alice$")))) == 5
+    assert len(db.fetch(Query(Field("key").startswith("alice$")), limit=3)) == 3
+    assert db.cache.misses == 1 and db.cache.hits == 3
+
+    db.delete("alice$0")
+    db.update("alice$1", {"age": 42})
+    assert [foo.age for foo in db.fetch(Query(Field("key").startswith("alice$")))] == [42, 2, 3, 4]
+    assert db.get("alice$1").age == 42
+    db.delete_prefix("alice$")
+    assert db.fetch(Query(Field("key").startswith("alice$"))) == []
+
+    small = Database("test_small_cache_db", Foo, cache=RecordCache(max_size=200, ttl=0))
+    small.put_many([Foo('bob', i, str(i)) for i in range(10)], key_source="id")
+    assert small.cache.size <= 200 and small.cache.evictions > 0
+    assert small.get("0").age == 0
+
+def test_compiled_codec():
+    from src.database.codec import compile_codec
+    db = Database("test_codec_db", Foo)
+    codec = compile_codec(Foo)
+    for foo in (Foo('bob', 20, '1', 2), Foo('$bob', 20, '$NOOP')):
+        encoded = db._encode_record(foo)
+        assert encoded == db.encode_entry(foo)
+        assert db._decode_checked(dict(encoded)) == db.decode_entry(dict(encoded)) == Foo(foo.name, 20, foo.id, foo._ignore)
+    assert codec.encode(Foo('$bob', 20, '1')) == db.encode_entry(Foo('$bob', 20, '1'))
+    assert codec.decode(db.encode_entry(Foo('$bob', 20, '1'))) is None  # Left to the generic decoder
+    assert codec.encode(Foo(None, 20, '1')) is None
+    assert compile_codec(Record) is None
+
+def test_typed_storage():
+    import pytest
+    from src.database.codec import compile_codec
+    legacy_db = Database("test_typed_storage_db", Foo)
+    db = Database("test_typed_storage_db", Foo, typed_storage=True)
+    legacy_db['legacy'] = Foo('alice', 21, '2')
+    db['typed'] = Foo('bob', 20, '$1')
+    db['nested'] = Foo('carol', 22, Foo('dave', 23, '4'))  # Not handled by the codec
+    assert '__class_name' not in db._encode_record(Foo('bob', 20, '1'))
+    assert '__class_name' not in db._encode_record(Foo('bob', 20, None))
+    assert compile_codec(Foo, True).decode({'name': 'bob', 'age': 20, 'id': '1', '_ignore': 1}) == Foo('bob', 20, '1')
+    assert db['legacy'] == Foo('alice', 21, '2')
+    assert db['typed'] == Foo('bob', 20, '$1')
+    assert db['nested'] == Foo('carol', 22, Foo('dave', 23, '4'))
+    assert sorted(foo.name for foo in db.fetch()) == ['alice', 'bob', 'carol']
+    with pytest.raises(ValueError):
+        Database("test_typed_storage_db", typed_storage=True)
+
+def test_record_functions():
+    foo = Foo('bob', 20, '1', 2)
+    assert foo.to_dict() == foo._to_dict()
+    assert list(foo.to_dict()) == list(foo._to_dict())
+    assert Foo.from_dict(foo.to_dict()) == Foo._from_dict(foo.to_dict()) == foo
+    assert Foo.from_dict({'name': 'bob', 'age': 20, 'id': '1', '_ignore': None}) == Foo('bob', 20, '1')
+    assert Foo.from_dict({'name': 'bob'}, strict=False) == Foo('bob', None, None, None)
+    nested = Foo('bob', 20, Foo('alice', 21, '2'))
+    assert nested.to_dict() == nested._to_dict()
+    assert nested.to_dict()['id']['__class_name'] == 'Foo'
+
+def test_direct_record():
+    record = Record(name="bob", age=20)
+    assert (record.name, record.age) == ("bob", 20) and isinstance(record, Record)
+    assert record.to_dict() == {
+        'name': 'bob', 'age': 20, '__database_load_method': 'Record.from_dict', '__class_name': None,
+    }
+
+def test_slotted_records(monkeypatch):
+    import sys
+    import types
+    from src.database import slotted_dataclass
+    from src.database import record as record_module
+    for version, name in (((3, 9), "SlottedFoo39"), (sys.version_info, "SlottedFoo")):
+        monkeypatch.setattr(record_module, "sys", types.SimpleNamespace(version_info=version))
+
+        @slotted_dataclass
+        class SlottedFoo(Record, database_model_name=name):
+            name: str
+            age: int = 1
+
+        foo = SlottedFoo('bob')
+        assert isinstance(vars(SlottedFoo)['name'], types.MemberDescriptorType) and not hasattr(foo, '__dict__')
+        assert Record._known_database_models[name] is SlottedFoo
+        assert foo.to_dict() == foo._to_dict() == {
+            'name': 'bob', 'age': 1, '__database_load_method': 'Record.from_dict', '__class_name': name,
+        }
+        db = Database(f"test_{name}_db", SlottedFoo)
+        db['bob'] = foo
+        assert db['bob'] == foo
+
+def test_row_storage(tmp_path, monkeypatch):
+    import json
+    from src.database.convert_storage import convert
+    monkeypatch.setenv("DETA_ORM_FOLDER", str(tmp_path))
+    monkeypatch.setenv("DETA_ORM_DATABASE_MODE", "DISK")
+    (tmp_path / "test_rows_db.json").write_text(json.dumps({"legacy": json.dumps({"name": "bob", "key": "legacy"})}))
+    convert("test_rows_db", "ROWS")
+    snapshot = json.loads((tmp_path / "test_rows_db.json").read_text())
+    assert snapshot["schemas"] == [["name"]] and snapshot["records"] == {"legacy": [0, "bob"]}
+
+    monkeypatch.setenv("DETA_ORM_STORAGE_FORMAT", "ROWS")
+    db = Database("test_rows_db", indexes=["age"])
+    db.put_many([Foo('alice', i, str(i)) for i in range(3)], key_source="id")
+    db.update("1", {"age": 10})
+    assert db["legacy"]["name"] == "bob"
+
+    monkeypatch.setenv("DETA_ORM_STORAGE_FORMAT", "JSON")  # Reads rows written with another format
+    reloaded = Database("test_rows_db")
+    assert [foo.age for foo in reloaded.fetch({"name": "alice"})] == [0, 10, 2]
+    assert reloaded.fetch({"age?gt": 5})[0].id == "1"
@@ -0,0 +1,34 @@
+from src.models.items import Item, ItemsLoader
+from src.models.extras_2 import ExtraInfo, ExtraInfoLoader
+
+def test_items_changes():
+    "Only new and changed items are updated, and items dropping to zero are deleted"
+    data = ItemsLoader.encode_story_items([Item(1, 5), Item(2, 0), Item(3, 7), Item(4, 2)], {})
+    loader = ItemsLoader(data=data, items=[Item(1, 5), Item(2, 4), Item(4, 1), Item(5, 9)])
+    loader.load()
+    assert loader.to_update == [Item(3, 7), Item(4, 2)]
+    assert loader.to_delete == [Item(2, 4)]
+    assert loader.items == [Item(1, 5), Item(4, 2), Item(5, 9), Item(3, 7)]
+
+def test_extras_changes():
+    "Only new and changed extra infos are updated"
+    data = ExtraInfoLoader.encode_story_extras([ExtraInfo(1, 1), ExtraInfo(2, 3), ExtraInfo(3, 0)], {})
+    loader = ExtraInfoLoader(data=data, infos=[ExtraInfo(1, 1), ExtraInfo(2, 2)])
+    loader.load()
+    assert loader.to_update == [ExtraInfo(2, 3), ExtraInfo(3, 0)]
+    assert loader.infos == [ExtraInfo(1, 1), ExtraInfo(2, 3), ExtraInfo(3, 0)]
+
+def test_extractor_writes():
+    "Writes are buffered, and `finalize` prefixes them with their length"
+    from src.models.extractor import DataExtractor, encode
+    writer = DataExtractor('')
+    writer.write_number(5)
+    writer.write_double_number(123)
+    writer.write_string('n')
+    writer.write_digit(3)
+    assert writer.finalize() == encode('213' + '15131231n3')
+    writer = DataExtractor('')
+    writer.write_number(5)
+    writer.write_number(7, prepend=True)
+    writer.write_double_number(10, prepend=True)
+    assert writer.get_length() == '211' and writer.data == '1210' + '17' + '15'
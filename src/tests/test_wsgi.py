@@ -96,3 +96,94 @@ def test_wsgi():
         e = get_environ(path, body)
         response = iter(app(e, start_response))
         assert next(response) == expected_response
+
+
+def test_story_profile_cache():
+    from src.manage_save import story_profile_cache
+
+    def start_response(status, headers):
+        assert status == '200 OK'
+
+    def post(body: bytes) -> bytes:
+        return next(iter(app(get_environ(path, body), start_response)))
+
+    post(bodies[2])  # saveStory
+    profile_key = 'username$2'
+    assert story_profile_cache.get(profile_key) is None
+    first = post(bodies[4])
+    assert story_profile_cache.get(profile_key) is not None
+    assert post(bodies[4]) == first
+
+    post(bodies[2])  # Saving again discards the cached response
+    assert story_profile_cache.get(profile_key) is None
+
+
+def test_story_profile_versions():
+    from src.manage_save import StoryProfileCache
+    cache = StoryProfileCache(max_profiles=2)
+    stale = cache.version("a")
+    for key in ("a", "b", "c", "d"):
+        cache.invalidate(key)
+    assert len(cache._versions) == 2
+
+    cache.set("a", "outdated", stale)  # Started before "a" changed, even though its version was dropped
+    assert cache.get("a") is None
+    cache.set("a", "response", cache.version("a"))
+    assert cache.get("a") == "response"
+
+    disabled = StoryProfileCache(max_profiles=0)
+    disabled.set("a", "response", disabled.version("a"))
+    assert disabled.get("a") is None
+
+
+def test_cache_enabled(monkeypatch):
+    from src.manage_save import get_cache_enabled
+    assert get_cache_enabled()  # MEMORY mode
+    monkeypatch.setenv("DETA_ORM_DATABASE_MODE", "DETA_BASE")  # Other instances may change the saves
+    assert not get_cache_enabled()
+    monkeypatch.setenv("PTD3_CACHE", "1")
+    assert get_cache_enabled()
+
+
+def test_document_parts(make_box):
+    import json
+    from src.manage_save import DOCUMENT_PART_SIZE, story_base, split_save_document, write_save_document, read_save_document
+    from src.models.extras_2 import ExtraInfo
+    from src.models.items import Item
+    # Worst case: the longest nicknames, with characters escaped in JSON
+    pokemons = make_box(3000)
+    for pokemon in pokemons:
+        pokemon.poke_nickname = "\u00e9\U0001F600" * 100
+    extras, items = [ExtraInfo(1, 1)], [Item(i, i) for i in range(100)]
+
+    parts = split_save_document(extras, pokemons, items)
+    assert len(parts) > 1
+    for part in parts:
+        assert len(json.dumps(story_base.encode_entry(part)).encode()) <= DOCUMENT_PART_SIZE
+
+    write_save_document("parts$1", extras, pokemons, items)
+    write_save_document("parts$1", extras, pokemons[:10], items, previous_parts=len(parts))
+    assert read_save_document("parts$1") == (extras, pokemons[:10], items, 1)
+
+
+def test_document_layout(monkeypatch):
+    from src.migrate_saves import migrate
+
+    def start_response(status, headers):
+        assert status == '200 OK'
+
+    def post(body: bytes, profile: str) -> bytes:
+        body = body.replace(b'whichProfile=2', f'whichProfile={profile}'.encode())
+        return next(iter(app(get_environ(path, body), start_response)))
+
+    monkeypatch.setenv("PTD3_SAVE_LAYOUT", "DOCUMENT")
+    assert post(bodies[2], '3') == expected_responses[2]
+    assert post(bodies[4], '3') == expected_responses[4]
+
+    # Saved with the RECORDS layout, then migrated
+    monkeypatch.setenv("PTD3_SAVE_LAYOUT", "RECORDS")
+    assert post(bodies[2], '1') == expected_responses[2]
+    records_response = post(bodies[4], '1')
+    migrate("DOCUMENT", delete=True)
+    monkeypatch.setenv("PTD3_SAVE_LAYOUT", "DOCUMENT")
+    assert post(bodies[4], '1') == records_response